@@ -1,14 +1,25 @@
+import asyncio
 import copy
+import gc
+import hashlib
 import inspect
+import io
+import itertools
 import json
+import os
+import pickle
 import re
+import struct
 import urllib.parse as urlparse
 from collections import UserList
-from datetime import datetime, timezone
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 from enum import Enum
 from functools import partial
-from typing import (Any, Callable, Collection, Dict, List, Mapping, Optional, Tuple, Type, Union)
+from time import perf_counter
+from types import MemberDescriptorType
+from typing import (Any, AsyncIterator, Callable, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Type, Union)
 from uuid import UUID
 from xml.etree import ElementTree as ET
 
@@ -20,24 +31,69 @@ class _MISSING_TYPE:
     def __str__(self):
         return "MISSING"
 
+    def __reduce__(self):
+        # keep the singleton across pickling
+        return "MISSING"
+
 
 MISSING = _MISSING_TYPE()
+
+
+class _UNSET_TYPE:
+    # a variable which is not set in the state of pickling, unlike MISSING which may be set by `__init__`
+
+    def __reduce__(self):
+        return "_UNSET"
+
+
+_UNSET = _UNSET_TYPE()
 CDATA_PATTERN = re.compile(r"<!\[CDATA\[(.*?)\]\]>")
 Json: Type[Any] = Union[dict, list, str, int, float, bool, None]
 JsonData = Union[str, bytes, bytearray]
 
 
 def custom_escape_cdata(text):
+    """ escape text of xml, but keep a CDATA section as it is """
     if not _isinstance_safe(text, str):
         text = str(text)
 
-    if CDATA_PATTERN.match(text):
+    # most of text isn't a CDATA section, check the prefix before matching the pattern
+    if text.startswith("<![CDATA[") and CDATA_PATTERN.match(text):
         return text
     return ET_escape_cdata(text)
 
 
 ET_escape_cdata = ET._escape_cdata
-ET._escape_cdata = custom_escape_cdata
+
+
+class _CDataText(str):
+    """ text of a CDATA section, ElementTree writes it without escaping.
+
+    ElementTree escapes text by replacing special characters one by one, which does nothing for this
+    text, so other users of ElementTree are not affected at all.
+    """
+
+    __slots__ = ()
+
+    def replace(self, old, new, count=-1):
+        if (old, new) in _ESCAPED_CHARS:
+            return self
+        return str.replace(self, old, new, count)
+
+
+_ESCAPED_CHARS = frozenset([("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")])
+
+
+def _xml_text(value):
+    # text set to elements built by `to_xml`, non-str values are written by their str form
+    if not value:
+        # ElementTree skips empty text
+        return value
+    if not _isinstance_safe(value, str):
+        value = str(value)
+    if value.startswith("<![CDATA[") and CDATA_PATTERN.match(value):
+        return _CDataText(value)
+    return value
 
 
 class _ExtendedEncoder(json.JSONEncoder):
@@ -62,6 +118,93 @@ class _ExtendedEncoder(json.JSONEncoder):
         return result
 
 
+class _Profiler:
+    """ counters of profiling, calls of codec methods are recorded per declared class, and conversions of
+    `auto_cast` per variable. operations are timed inclusively, so the time of `to_json` includes its `to_dict`.
+    """
+
+    def __init__(self):
+        self.started = perf_counter()
+        # [calls, seconds, bytes] keyed by (class, operation)
+        self.calls: Dict[Tuple[type, str], List[Union[int, float]]] = {}
+        self.casts: Dict['Var', int] = {}
+
+    def record(self, cls: type, operation: str, seconds: float, size: int = 0):
+        counter = self.calls.get((cls, operation))
+        if counter is None:
+            counter = self.calls[(cls, operation)] = [0, 0.0, 0]
+        counter[0] += 1
+        counter[1] += seconds
+        counter[2] += size
+
+    def count_cast(self, field: 'Var'):
+        self.casts[field] = self.casts.get(field, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        classes: Dict[str, Dict[str, Dict[str, Union[int, float]]]] = {}
+        for (cls, operation), (calls, seconds, size) in self.calls.items():
+            # classes of the same name are merged, as same as they are registered by their names
+            counter = classes.setdefault(cls.__name__, {}).setdefault(operation, {"calls": 0, "seconds": 0.0, "bytes": 0})
+            counter["calls"] += calls
+            counter["seconds"] += seconds
+            counter["bytes"] += size
+        casts: Dict[str, int] = {}
+        for field, count in self.casts.items():
+            name = f"{field.owner.__name__}.{field.name}" if field.owner is not None else field.name
+            casts[name] = casts.get(name, 0) + count
+        return {"seconds": perf_counter() - self.started, "classes": classes, "casts": casts}
+
+
+def _encoded_size(data: Union[str, bytes, bytearray]) -> int:
+    # sizes of json are counted in bytes, str is counted as utf-8
+    if _isinstance_safe(data, str):
+        return len(data.encode("utf-8"))
+    return len(data)
+
+
+# None unless profiling is enabled, codec methods check it before anything else
+_profiler: Optional[_Profiler] = None
+
+
+def enable_profiling():
+    """ start recording calls, time and bytes of `from_dict`, `to_dict`, `from_json`, `to_json`, `from_xml` and
+    `to_xml` per declared class, and conversions of `auto_cast` per variable. it clears counters recorded before.
+    bytes are the sizes of json in utf-8, they are 0 for other operations.
+
+    >>> enable_profiling()
+    >>> ......
+    >>> exporter.publish(profiling_snapshot(reset=True))
+    """
+    global _profiler
+    _profiler = _Profiler()
+
+
+def disable_profiling() -> Dict[str, Any]:
+    """ stop recording, and return the last snapshot """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler.snapshot() if profiler is not None else {}
+
+
+def profiling_snapshot(reset: bool = False) -> Dict[str, Any]:
+    """ return counters recorded so far as a dict of plain values, it is empty when profiling is disabled.
+
+    >>> profiling_snapshot()
+    >>> {"seconds": 60.0,
+    >>>  "classes": {"User": {"from_dict": {"calls": 10, "seconds": 0.0003, "bytes": 0}, ......}},
+    >>>  "casts": {"User.age": 10}}
+
+    :param reset: a bool object, if it is True then counters are cleared after the snapshot.
+    """
+    global _profiler
+    profiler = _profiler
+    if profiler is None:
+        return {}
+    if reset:
+        _profiler = _Profiler()
+    return profiler.snapshot()
+
+
 class NamingStyle:
     """ reference to python-stringcase
 
@@ -93,6 +236,11 @@ class NamingStyle:
 class Var:
     """ a represantation of declared class member varaiable
     recommend use var function to create Var object, don't use this construct directly
+
+    it is installed on the declared class as a non-data descriptor, so reading a variable which
+    has been set costs as same as a normal attribute, and `__get__` is only called to fill the
+    default value of a variable which hasn't been set yet, or to decode the raw value of a variable
+    which is left by lazy decoding.
     """
 
     def __init__(self,
@@ -120,6 +268,10 @@ class Var:
 
         self.as_xml_attr = as_xml_attr
         self.as_xml_text = as_xml_text
+        self._caster = None
+        self._check_type = None
+        # the declared class defining this variable
+        self.owner = None
 
     @property
     def field_name(self):
@@ -134,6 +286,27 @@ class Var:
             self._type = _REGISTER_DECLARED_CLASS[self._type]
         return self._type
 
+    @property
+    def caster(self):
+        """ Cache handled cast function, picked once by the resolved type of this variable """
+        if self._caster is None:
+            self._caster = _make_caster(self)
+        return self._caster
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        raw = getattr(instance, "__declared_raw__", None)
+        if raw and self.name in raw:
+            value = raw.decode(self)
+        else:
+            value = self.make_default()
+            if value is MISSING:
+                return None
+        object.__setattr__(instance, self.name, value)
+        return value
+
     def make_default(self):
         field_value = MISSING
         if self.default is not MISSING:
@@ -148,14 +321,26 @@ class Var:
     def check(self, obj):
         if obj is MISSING or obj is None:
             return True
-        type_ = self.type_
-        if getattr(type_, "__origin__", None):
-            type_ = type_.__origin__
 
-        if not _isinstance_safe(obj, type_):
+        check_type = self._check_type
+        if check_type is None:
+            # cache the resolved type, and the origin of generic alias such as List[int]
+            check_type = self.type_
+            if getattr(check_type, "__origin__", None):
+                check_type = check_type.__origin__
+            self._check_type = check_type
+
+        if not _isinstance_safe(obj, check_type):
             raise TypeError("%r is not a instance of %r" % (type(obj).__name__, self.type_.__name__))
         return True
 
+    def make_default_unchecked(self):
+        if self.default is not MISSING:
+            return self.default
+        elif self.default_factory is not MISSING:
+            return self.default_factory()
+        return MISSING
+
 
 def var(type_,
         required=True,
@@ -213,8 +398,24 @@ camelcase_var = partial(var, naming_style=NamingStyle.camelcase)
 
 
 class BaseDeclared(type):
+    """ metaclass of Declared, collects variables into `fields` and `meta`.
+
+    class options:
+        slots: a bool object, if it is True then the instances store variables in `__slots__`
+               instead of a per-instance `__dict__`.
+        validate: a bool object, if it is False then setting attributes and decoding skip `Var.check`,
+                  it is used for data from trusted sources. it is inherited from base classes, and True by default.
+        frozen: a bool object, if it is True then variables can't be set or deleted after `__init__`, the hash and
+                the results of `to_dict` and `to_json` are computed once and cached in the object, `to_dict` hands
+                out a copy of the cached dict. values of variables must not be changed in place either, nested
+                objects should be frozen too. it is inherited from base classes, and False by default.
+
+    >>> class Point(Declared, slots=True):
+    >>>     x = var(int)
+    >>>     y = var(int)
+    """
 
-    def __new__(cls, name, bases, attrs):
+    def __new__(cls, name, bases, attrs, slots=False, validate=None, frozen=None):
         if name == "Declared":
             return super(BaseDeclared, cls).__new__(cls, name, bases, attrs)
 
@@ -223,17 +424,26 @@ class BaseDeclared(type):
         for base in bases:
             meta = getattr(base, "meta", None)
             if meta:
+                if validate is None:
+                    validate = meta.get("validate", True)
+                if meta.get("frozen"):
+                    if frozen is False:
+                        raise TypeError(f"cannot inherit non-frozen class {name} from frozen class {base.__name__}")
+                    frozen = True
                 base_meta_vars = meta.get("vars", {})
                 meta_vars.update(base_meta_vars)
-                fields.extend(base_meta_vars.keys())
+                fields.extend(k for k in base_meta_vars.keys() if k not in fields)
+                continue
 
             for k, v in base.__dict__.items():
                 if _isinstance_safe(v, Var):
-                    fields.append(k)
+                    if k not in fields:
+                        fields.append(k)
                     var = v
                     var.name = k
                     meta_vars[k] = var
 
+        new_vars = {}
         for key in list(attrs.keys()):
             if isinstance(attrs[key], Var):
                 if key not in fields:
@@ -241,13 +451,49 @@ class BaseDeclared(type):
                 var = attrs.pop(key)
                 var.name = key
                 meta_vars[key] = var
-
-        meta = {"vars": meta_vars}
+                new_vars[key] = var
+
+        if slots:
+            # those variables have been stored in slots of base classes
+            slotted = set()
+            for base in bases:
+                for c in base.__mro__:
+                    slotted.update(c.__dict__.get("__slots__", ()))
+            attrs["__slots__"] = tuple(attrs.get("__slots__", ())) + tuple(f for f in fields if f not in slotted)
+            if frozen:
+                attrs["__slots__"] += tuple(f for f in _FROZEN_CACHES if f not in slotted)
+
+        meta = {"vars": meta_vars, "validate": validate is not False, "frozen": frozen is True}
         new_cls = super(BaseDeclared, cls).__new__(cls, name, bases, attrs)
         _REGISTER_DECLARED_CLASS[name] = new_cls
         new_cls.add_attribute("fields", tuple(fields))
         new_cls.add_attribute("meta", meta)
         new_cls.add_attribute("__annotations__", meta_vars)
+        for key, var in new_vars.items():
+            var.owner = new_cls
+            # variables in slots are accessed by their slot descriptors
+            if _slot_of(new_cls, key) is None:
+                new_cls.add_attribute(key, var)
+
+        # generate specialized methods, unless user has written them in this class or its bases
+        for method_name, build in (("__init__", _build_init), ("__eq__", _build_eq),
+                                   ("__hash__", _build_frozen_hash if meta["frozen"] else _build_hash),
+                                   ("__str__", _build_str), ("__repr__", _build_repr)):
+            if _is_generated_method(new_cls, method_name):
+                new_cls.add_attribute(method_name, build(new_cls))
+
+        if meta["frozen"]:
+            for method_name, method in (("__setattr__", _frozen_setattr), ("__delattr__", _frozen_delattr),
+                                        ("to_dict", _frozen_to_dict), ("to_json", _frozen_to_json)):
+                # `__setattr__` of a base without validation has been replaced by `object.__setattr__`
+                if method_name not in attrs and getattr(new_cls, method_name) in (getattr(Declared, method_name),
+                                                                                  getattr(object, method_name, None)):
+                    new_cls.add_attribute(method_name, method)
+        elif "__setattr__" not in attrs:
+            # setting attributes of a class without validation is as same as a plain object
+            setattr_ = Declared.__setattr__ if meta["validate"] else object.__setattr__
+            if getattr(new_cls, "__setattr__") in (Declared.__setattr__, object.__setattr__):
+                new_cls.add_attribute("__setattr__", setattr_)
         return new_cls
 
     def add_attribute(cls, name, attr):
@@ -262,6 +508,7 @@ class Declared(metaclass=BaseDeclared):
     """
 
     __xml_tag_name__ = ""
+    __slots__ = ()
 
     def __init__(self, *args, **kwargs):
         kwargs.update(dict(zip(self.fields, args)))
@@ -292,28 +539,26 @@ class Declared(metaclass=BaseDeclared):
         """"""
 
     def __setattr__(self, name, value):
-        if name in self.fields:
-            self.meta["vars"][name].check(value)
+        meta_var = self.meta["vars"].get(name)
+        if meta_var is not None:
+            meta_var.check(value)
         super().__setattr__(name, value)
 
     def __getattr__(self, name):
+        # only be reached when normal lookup is failed, it means a variable stored in a empty slot,
+        # otherwise `Var.__get__` has filled the default value.
         try:
-            result = self.__getattribute__(name)
-            if result is MISSING:
-                return None
-            return result
-        except AttributeError as why:
-            try:
-                meta_var = self.meta["vars"][name]
-            except KeyError:
-                raise why
-            else:
-                value = meta_var.make_default()
-                if value is MISSING:
-                    return None
-                else:
-                    super().__setattr__(name, value)
-                    return value
+            meta_var = self.meta["vars"][name]
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {name!r}") from None
+        return meta_var.__get__(self)
+
+    def __reduce__(self):
+        # pickle values of variables as a tuple in order of fields, they are restored without validation
+        values, extra = _declared_state_getter(self.__class__)(self)
+        if extra:
+            return _restore_declared, (self.__class__, values), extra
+        return _restore_declared, (self.__class__, values)
 
     @classmethod
     def has_nest_declared_class(cls):
@@ -339,8 +584,12 @@ class Declared(metaclass=BaseDeclared):
                 sort_keys: bool = False,
                 skip_none_field=False,
                 **kw):
-        return json.dumps(
-            self.to_dict(encode_json=False, skip_none_field=skip_none_field),
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
+        result = json.dumps(
+            # the dict is discarded after dumping, so leaf values needn't be copied
+            self.to_dict(encode_json=False, skip_none_field=skip_none_field, copy="none"),
             cls=_ExtendedEncoder,
             skipkeys=skipkeys,
             ensure_ascii=ensure_ascii,
@@ -351,6 +600,9 @@ class Declared(metaclass=BaseDeclared):
             default=default,
             sort_keys=sort_keys,
             **kw)
+        if profiler is not None:
+            profiler.record(self.__class__, "to_json", perf_counter() - start, _encoded_size(result))
+        return result
 
     @classmethod
     def from_json(cls: Type['Declared'],
@@ -360,17 +612,165 @@ class Declared(metaclass=BaseDeclared):
                   parse_float=None,
                   parse_int=None,
                   parse_constant=None,
+                  validate: Optional[bool] = None,
+                  lazy: bool = False,
+                  only: Optional[Iterable[str]] = None,
+                  exclude: Optional[Iterable[str]] = None,
                   **kw):
-        kvs = json.loads(
-            s, encoding=encoding, parse_float=parse_float, parse_int=parse_int, parse_constant=parse_constant, **kw)
-        return cls.from_dict(kvs)
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
+        # `encoding` is kept for compatibility only, json.loads ignores it since python3.1 and rejects it since python3.9
+        kvs = json.loads(s, parse_float=parse_float, parse_int=parse_int, parse_constant=parse_constant, **kw)
+        result = cls.from_dict(kvs, validate=validate, lazy=lazy, only=only, exclude=exclude)
+        if profiler is not None:
+            profiler.record(cls, "from_json", perf_counter() - start, _encoded_size(s))
+        return result
+
+    @classmethod
+    def from_dict(cls: Type['Declared'],
+                  kvs: dict,
+                  validate: Optional[bool] = None,
+                  lazy: bool = False,
+                  only: Optional[Iterable[str]] = None,
+                  exclude: Optional[Iterable[str]] = None):
+        """
+        >>> User.from_dict(data, only=["name", "address.city"])
+        :param validate: a bool object, if it is False then objects are built by `construct` without checks,
+                         it is the `validate` class option by default.
+        :param lazy: a bool object, if it is True then variables of declared classes and lists are kept raw,
+                     and decoded at their first access, also lazily. `to_dict` and `to_json` write the raw
+                     values which are never accessed as they were received. it works for classes which
+                     store variables in `__dict__` and don't define their own `__init__`, others are decoded
+                     as usual.
+        :param only: paths of variables to decode, a path is made of variable names joined by ".", and selects
+                     a variable of the nested declared class or items of the nested list. other variables are
+                     skipped and left unset, reading them gives their default values or None, and the objects are
+                     built without `__init__` of the class, as same as lazy decoding.
+        :param exclude: paths of variables to skip, works as same as `only` and can be used with it.
+        """
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
+        result = _decode_dict_to_declared_class(cls, kvs, validate, lazy, _Projection.parse(only, exclude))
+        if profiler is not None:
+            profiler.record(cls, "from_dict", perf_counter() - start)
+        return result
 
     @classmethod
-    def from_dict(cls: Type['Declared'], kvs: dict):
-        return _decode_dict_to_declared_class(cls, kvs)
+    def construct(cls: Type['Declared'], **values):
+        """ build an object from trusted values, without `Var.check`, required checks and `__post_init__`.
+        variables missing in `values` are set to their default values, or MISSING if they are optional and don't
+        have one, as same as `__init__`. required variables missing in `values` are left unset.
+        values are not cast, so they must be instances of declared types already.
+        """
+        return _declared_constructor(cls)(**values)
+
+    def replace(self, **changes) -> 'Declared':
+        """ return a copy of this object with some variables changed, only changed values are checked by
+        `Var.check` unless validation is off for the class. other values are shared with this object, so nested
+        objects and lists are not copied. `__init__` and `__post_init__` are not called.
+
+        >>> user = user.replace(name="Jane", age=21)
+        """
+        return _replace_declared(self, changes)
 
-    def to_dict(self, encode_json=False, skip_none_field=False):
-        return _asdict(self, encode_json=encode_json, skip_none_field=skip_none_field)
+    def to_dict(self, encode_json=False, skip_none_field=False, copy="shallow"):
+        """
+        :param copy: a str object, the policy of copying leaf values which are not converted to dict or list,
+                     "none" hands out the values themselves, "shallow" copies them by `copy.copy`, "deep" copies
+                     them by `copy.deepcopy`. immutable values such as str, int, Decimal and UUID are never copied.
+        """
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
+        result = _asdict(self, encode_json=encode_json, skip_none_field=skip_none_field, copy_value=_copy_policy(copy))
+        if profiler is not None:
+            profiler.record(self.__class__, "to_dict", perf_counter() - start)
+        return result
+
+    def to_binary(self) -> bytes:
+        """ encode this object in a compact binary format, variables are written in order of fields without
+        their names. the data carries a fingerprint of the schema, so reading it by a class whose variables
+        are different raises ValueError.
+
+        >>> User.from_binary(user.to_binary())
+        """
+        out = bytearray(_binary_header(self.__class__))
+        _write_object(self.__class__, out, self)
+        return bytes(out)
+
+    @classmethod
+    def from_binary(cls: Type['Declared'], data: bytes, validate: Optional[bool] = None) -> 'Declared':
+        """
+        :param validate: as same as the parameter of `from_dict`.
+        """
+        if validate is None:
+            validate = cls.meta["validate"]
+        data = bytes(data)
+        try:
+            obj, pos = _read_object(cls, validate, data, _check_binary_header(cls, data))
+        except (IndexError, struct.error):
+            raise ValueError("binary data is truncated or corrupt") from None
+        if pos != len(data):
+            raise ValueError(f"unexpected data after position {pos} of binary data")
+        return obj
+
+    @classmethod
+    def iter_jsonl(cls: Type['Declared'], source: Union[Iterable[str], Iterable[bytes]]) -> Iterator['Declared']:
+        """ decode a NDJSON (JSON Lines) stream and yield one object per line, blank lines are skipped.
+
+        >>> with open("records.jsonl", "rb") as fp:
+        >>>     for record in Record.iter_jsonl(fp):
+        >>>         ......
+
+        :param source: a file object, or an iterable of str or bytes chunks which may split lines anywhere.
+        """
+        decoder = _declared_decoder(cls, cls.meta["validate"])
+        for line in _iter_lines(source):
+            if line.strip():
+                yield decoder(json.loads(line))
+
+    @classmethod
+    async def aiter_jsonl(cls: Type['Declared'],
+                          reader: asyncio.StreamReader,
+                          executor: Optional[Executor] = None,
+                          chunk_size: int = 65536) -> AsyncIterator['Declared']:
+        """ decode a NDJSON stream from a asyncio reader as same as `iter_jsonl`, lines are decoded chunk by
+        chunk as they arrive, so neither the whole stream is buffered nor a long line has to fit the limit of
+        `StreamReader.readline`.
+
+        >>> reader, writer = await asyncio.open_connection(host, port)
+        >>> async for record in Record.aiter_jsonl(reader):
+        >>>     ......
+
+        :param reader: a asyncio.StreamReader object.
+        :param executor: a executor to decode chunks in, so CPU-heavy chunks don't block the event loop,
+                         chunks are decoded in the event loop by default.
+        :param chunk_size: a int object, size of chunks read from `reader` at a time.
+        """
+        loop = asyncio.get_running_loop()
+        pending = []
+        while True:
+            chunk = await reader.read(chunk_size)
+            if chunk:
+                end = chunk.rfind(b"\n") + 1
+                if not end:
+                    pending.append(chunk)
+                    continue
+                pending.append(chunk[:end])
+                lines, pending = b"".join(pending), [chunk[end:]]
+            else:
+                lines, pending = b"".join(pending), []
+                if not lines:
+                    return
+
+            if executor is None:
+                items = _decode_jsonl(cls, lines)
+            else:
+                items = await loop.run_in_executor(executor, _decode_jsonl, cls, lines)
+            for item in items:
+                yield item
 
     @classmethod
     def from_form_data(cls: Type['Declared'], form_data):
@@ -411,7 +811,10 @@ class Declared(metaclass=BaseDeclared):
             quote_via=quote_via)
 
     @classmethod
-    def from_xml(cls: Type['Declared'], element: ET.Element) -> ET.Element:
+    def from_xml(cls: Type['Declared'],
+                 element: ET.Element,
+                 only: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None) -> ET.Element:
         """
         >>> class Struct(Declared):
         >>>     tag = var(str)
@@ -422,12 +825,24 @@ class Declared(metaclass=BaseDeclared):
         >>>     id = var(str)
         >>>     style = var(str)
         >>>     ......
+
+        :param only: as same as the parameter of `from_dict`.
+        :param exclude: as same as the parameter of `from_dict`.
         """
-        return _decode_xml_to_declared_class(cls, element)
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
+        result = _decode_xml_to_declared_class(cls, element, _Projection.parse(only, exclude))
+        if profiler is not None:
+            profiler.record(cls, "from_xml", perf_counter() - start)
+        return result
 
     @classmethod
-    def from_xml_string(cls: Type['Declared'], xml_string) -> ET.Element:
-        return cls.from_xml(ET.XML(xml_string))
+    def from_xml_string(cls: Type['Declared'],
+                        xml_string,
+                        only: Optional[Iterable[str]] = None,
+                        exclude: Optional[Iterable[str]] = None) -> ET.Element:
+        return cls.from_xml(ET.XML(xml_string), only=only, exclude=exclude)
 
     def to_xml(self, skip_none_field: bool = False) -> ET.Element:
         """
@@ -436,6 +851,9 @@ class Declared(metaclass=BaseDeclared):
             `text`
         </tag>
         """
+        profiler = _profiler
+        if profiler is not None:
+            start = perf_counter()
         tag = self.__xml_tag_name__ if self.__xml_tag_name__ else self.__class__.__name__.lower()
         root = ET.Element(tag)
         for field in fields(self):
@@ -446,33 +864,47 @@ class Declared(metaclass=BaseDeclared):
                     root.set(field.field_name, new_attr)
             elif field.as_xml_text:
                 # handle has multiple attributes and text element, like <country size="large">Panama</country>
-                root.text = getattr(self, field.name, "")
+                field_value = getattr(self, field.name, None)
+                if field_value is not None and field_value is not MISSING:
+                    root.text = _xml_text(field_value)
             elif _issubclass_safe(field.type_, GenericList):
                 # handle a series of struct or native type data
                 field_value = getattr(self, field.name, MISSING)
-                if field_value is not MISSING:
+                if field_value is not MISSING and field_value is not None:
                     root.extend(field_value.to_xml(skip_none_field))
             elif _issubclass_safe(field.type_, Declared):
                 # handle complex struct data
                 field_value = getattr(self, field.name, MISSING)
-                if field_value is not MISSING:
+                if field_value is not MISSING and field_value is not None:
                     root.append(field_value.to_xml(skip_none_field))
             else:
                 # handle simple node just like <name>John</name>
                 field_value = getattr(self, field.name, None)
-                if field_value is not None:
+                if field_value is not None and field_value is not MISSING:
                     elem = ET.Element(field.field_name)
-                    elem.text = field_value
+                    elem.text = _xml_text(field_value)
                     root.append(elem)
+        if profiler is not None:
+            profiler.record(self.__class__, "to_xml", perf_counter() - start)
         return root
 
     def to_xml_bytes(self, skip_none_field: bool = False, **kwargs) -> bytes:
         return ET.tostring(self.to_xml(skip_none_field), **kwargs)
 
+    def to_xml_stream(self, fp, skip_none_field: bool = False, encoding: str = "us-ascii"):
+        """ write the xml of this object to `fp` element by element without building an element tree,
+        the output is as same as `to_xml_bytes`.
+
+        :param fp: a text or binary file object, text is encoded by `encoding` for the latter.
+        """
+        _write_xml_stream(fp, _iter_declared_xml(self, skip_none_field), encoding)
+
     def __str__(self):
         args = [f"{var.name}={str(getattr(self, var.name, 'missing'))}" for _, var in self.meta["vars"].items()]
         return f"{self.__class__.__name__}({','.join(args)})"
 
+    __repr__ = __str__
+
     def __eq__(self, other):
         if other.__class__ != self.__class__:
             return False
@@ -518,6 +950,10 @@ class GenericList(UserList):
                 raise TypeError(f"Type of instance {str(item)} is {type(item)}, but not {self.__type__}.")
         self.tag = tag
 
+    def __reduce__(self):
+        state = {k: v for k, v in self.__dict__.items() if k != "data"}
+        return _restore_list, (_list_type_key(self.__class__), self.data), state
+
     @classmethod
     def from_json(cls: Type['GenericList'],
                   s: JsonData,
@@ -527,10 +963,62 @@ class GenericList(UserList):
                   parse_int=None,
                   parse_constant=None,
                   **kw) -> 'GenericList':
-        kvs = json.loads(
-            s, encoding=encoding, parse_float=parse_float, parse_int=parse_int, parse_constant=parse_constant, **kw)
+        # `encoding` is kept for compatibility only, json.loads ignores it since python3.1 and rejects it since python3.9
+        kvs = json.loads(s, parse_float=parse_float, parse_int=parse_int, parse_constant=parse_constant, **kw)
+        if _issubclass_safe(cls.__type__, Declared):
+            return cls.from_dicts(kvs)
         return cls(kvs)
 
+    @classmethod
+    def from_json_parallel(cls: Type['GenericList'],
+                           s: JsonData,
+                           workers: Optional[int] = None,
+                           chunk_size: Optional[int] = None,
+                           **kw) -> 'GenericList':
+        """ decode a large json array by a process pool, the array is split into chunks of items without
+        parsing, each chunk is parsed and decoded in a worker, and results are joined in order. A chunk is
+        parsed with the brackets of the whole array, so a split in the middle of an item always fails to
+        parse, then the whole array is decoded by `from_json` in the current process instead. It is decoded in
+        the current process too if the item class or arguments can't be pickled, such as a class defined in a
+        function.
+
+        >>> Users = new_list_type(User)
+        >>> users = Users.from_json_parallel(data, workers=8)
+
+        :param workers: a int object, number of worker processes, it is the number of cpus by default.
+        :param chunk_size: a int object, approximate length of chunks, it splits the array into 4 chunks
+                           per worker by default.
+        :param kw: arguments of `from_json`, they must be picklable.
+        """
+        return _decode_list_parallel(cls, "from_json", s, _json_array_chunks, workers, chunk_size, kw)
+
+    @classmethod
+    def from_dicts(cls: Type['GenericList'],
+                   rows: Iterable[Dict[str, Any]],
+                   validate: Optional[bool] = None) -> 'GenericList':
+        """ decode a series of dicts into declared items in bulk.
+
+        the rows are decoded column by column, the cast of each variable is resolved once and applied to
+        the whole column, a column which isn't made of the declared type falls back to cast value by value.
+
+        >>> Users = new_list_type(User)
+        >>> users = Users.from_dicts([{"name": "John", "age": 18}, {"name": "Jane", "age": 19}])
+
+        :param validate: as same as the parameter of `Declared.from_dict`.
+        """
+        if not _issubclass_safe(cls.__type__, Declared):
+            raise TypeError(f"Type {cls.__name__} cannot be decoded from dicts, {cls.__type__} is not a declared class")
+
+        # decoding allocates a lot of objects without any reference cycle, pause the cyclic garbage collector
+        # which would otherwise traverse all of them again and again.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return cls(_decode_column(cls.__type__, list(rows), validate))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
     def to_json(self,
                 skipkeys: bool = False,
                 ensure_ascii: bool = True,
@@ -542,7 +1030,7 @@ class GenericList(UserList):
                 sort_keys: bool = False,
                 skip_none_field=False,
                 **kw) -> JsonData:
-        return json.dumps([inst.to_dict(encode_json=False, skip_none_field=skip_none_field) for inst in self.data],
+        return json.dumps(_encode_list(self._encodable_data(), skip_none_field=skip_none_field, copy_value=_copy_nothing),
                           cls=_ExtendedEncoder,
                           skipkeys=skipkeys,
                           ensure_ascii=ensure_ascii,
@@ -554,6 +1042,149 @@ class GenericList(UserList):
                           sort_keys=sort_keys,
                           **kw)
 
+    def to_binary(self) -> bytes:
+        """ encode items in the binary format of `Declared.to_binary` """
+        out = bytearray(_binary_header(self.__class__))
+        _write_any(out, self.tag)
+        _write_sequence(out, list(self), _binary_writer(self.__type__))
+        return bytes(out)
+
+    @classmethod
+    def from_binary(cls: Type['GenericList'], data: bytes, validate: Optional[bool] = None) -> 'GenericList':
+        """
+        :param validate: as same as the parameter of `Declared.from_dict`.
+        """
+        data = bytes(data)
+        try:
+            tag, pos = _read_any(data, _check_binary_header(cls, data))
+            items, pos = _read_list(cls, _binary_reader(cls.__type__, validate), data, pos)
+        except (IndexError, struct.error):
+            raise ValueError("binary data is truncated or corrupt") from None
+        if pos != len(data):
+            raise ValueError(f"unexpected data after position {pos} of binary data")
+        items.tag = tag
+        return items
+
+    def to_jsonl(self,
+                 fp,
+                 skipkeys: bool = False,
+                 ensure_ascii: bool = True,
+                 check_circular: bool = True,
+                 allow_nan: bool = True,
+                 default: Callable = None,
+                 sort_keys: bool = False,
+                 skip_none_field=False,
+                 **kw):
+        """ write items to `fp` as NDJSON (JSON Lines), one item per line, items are encoded one by one.
+
+        :param fp: a text or binary file object, bytes are encoded by utf-8 for the latter.
+        """
+        encoder = _ExtendedEncoder(
+            skipkeys=skipkeys,
+            ensure_ascii=ensure_ascii,
+            check_circular=check_circular,
+            allow_nan=allow_nan,
+            default=default,
+            sort_keys=sort_keys,
+            **kw)
+        binary = _isinstance_safe(fp, (io.RawIOBase, io.BufferedIOBase))
+        for item in self._encodable_data():
+            line = encoder.encode(_asdict(item, skip_none_field=skip_none_field, copy_value=_copy_nothing)) + "\n"
+            fp.write(line.encode("utf-8") if binary else line)
+
+    def to_json_iter(self,
+                     skipkeys: bool = False,
+                     ensure_ascii: bool = True,
+                     check_circular: bool = True,
+                     allow_nan: bool = True,
+                     indent: Optional[Union[int, str]] = None,
+                     separators: Tuple[str, str] = None,
+                     default: Callable = None,
+                     sort_keys: bool = False,
+                     skip_none_field=False,
+                     chunk_size: int = 65536,
+                     **kw) -> Iterator[str]:
+        """ encode items one by one and yield the json document in chunks, the joined chunks are as same as
+        the result of `to_json`, but neither the whole list of dicts nor the whole string is built at once.
+
+        >>> for chunk in users.to_json_iter():
+        >>>     response.write(chunk)
+
+        :param chunk_size: an int object, chunks are yielded once their encoded items exceed this length.
+        """
+        encoder = _ExtendedEncoder(
+            skipkeys=skipkeys,
+            ensure_ascii=ensure_ascii,
+            check_circular=check_circular,
+            allow_nan=allow_nan,
+            indent=indent,
+            separators=separators,
+            default=default,
+            sort_keys=sort_keys,
+            **kw)
+        if not self.data:
+            yield "[]"
+            return
+
+        if indent is None:
+            newline = ""
+        else:
+            # json strings never contain a raw newline, so an item is nested one level deeper by indenting its lines
+            newline = "\n" + (" " * indent if isinstance(indent, int) else indent)
+        separator = encoder.item_separator + newline
+
+        parts = ["[", newline]
+        size = 0
+        for i, item in enumerate(self._encodable_data()):
+            if i:
+                parts.append(separator)
+            encoded = encoder.encode(_asdict(item, skip_none_field=skip_none_field, copy_value=_copy_nothing))
+            if newline:
+                encoded = encoded.replace("\n", newline)
+            parts.append(encoded)
+            size += len(encoded)
+            if size >= chunk_size:
+                yield "".join(parts)
+                parts.clear()
+                size = 0
+        if indent is not None:
+            parts.append("\n")
+        parts.append("]")
+        yield "".join(parts)
+
+    def dump(self, fp, **kwargs):
+        """ write the json document of items to `fp` chunk by chunk, the keyword arguments are as same as
+        `to_json_iter`.
+
+        :param fp: a text or binary file object, bytes are encoded by utf-8 for the latter.
+        """
+        binary = _isinstance_safe(fp, (io.RawIOBase, io.BufferedIOBase))
+        for chunk in self.to_json_iter(**kwargs):
+            fp.write(chunk.encode("utf-8") if binary else chunk)
+
+    async def awrite_json(self, writer: asyncio.StreamWriter, executor: Optional[Executor] = None, **kwargs):
+        """ write the json document of items to a asyncio writer chunk by chunk, and wait for `drain()` after
+        each chunk, so a slow peer holds back encoding instead of buffering the whole document. The keyword
+        arguments are as same as `to_json_iter`.
+
+        >>> await users.awrite_json(writer)
+
+        :param writer: a asyncio.StreamWriter object, chunks are encoded by utf-8.
+        :param executor: a thread pool executor to encode chunks in, so CPU-heavy chunks don't block the
+                         event loop, chunks are encoded in the event loop by default.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.to_json_iter(**kwargs)
+        while True:
+            if executor is None:
+                chunk = next(chunks, None)
+            else:
+                chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            writer.write(chunk.encode("utf-8"))
+            await writer.drain()
+
     @classmethod
     def from_xml(cls: Type['GenericList'], element: ET.Element) -> 'GenericList':
         return cls((cls.__type__.from_xml(sub) for sub in element), tag=element.tag)
@@ -566,6 +1197,55 @@ class GenericList(UserList):
     def from_xml_string(cls: Type['GenericList'], xml_string) -> 'GenericList':
         return cls.from_xml(ET.XML(xml_string))
 
+    @classmethod
+    def from_xml_parallel(cls: Type['GenericList'],
+                          xml_string,
+                          workers: Optional[int] = None,
+                          chunk_size: Optional[int] = None) -> 'GenericList':
+        """ decode children of the root element of a large xml document by a process pool, as same as
+        `from_json_parallel`. Each chunk of children is parsed with the prolog and root element of the whole
+        document, so namespaces and encoding declared there apply to all chunks.
+
+        >>> Countries = new_list_type(Country)
+        >>> countries = Countries.from_xml_parallel(data, workers=8)
+        """
+        return _decode_list_parallel(cls, "from_xml_string", xml_string, _xml_children_chunks, workers, chunk_size, {})
+
+    @classmethod
+    def iter_xml(cls: Type['GenericList'], source, item_tag: str = None) -> Iterator[Declared]:
+        """ parse a xml document incrementally and yield decoded items one by one, the elements of
+        decoded items are dropped from the tree, so memory stays constant regardless of document size.
+
+        >>> Countries = new_list_type(Country)
+        >>> for country in Countries.iter_xml("countries.xml", "country"):
+        >>>     ......
+
+        :param source: a filename or file object containing xml data.
+        :param item_tag: a str object, tag of elements to decode as items, it is the tag name of `__type__`
+                         by default. Elements with this tag nested in another item are decoded as part of it.
+        """
+        if item_tag is None:
+            item_tag = cls.__type__.__xml_tag_name__ or cls.__type__.__name__.lower()
+
+        parents: List[ET.Element] = []
+        depth = 0
+        for event, element in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                if element.tag == item_tag:
+                    depth += 1
+                continue
+
+            parents.pop()
+            if element.tag != item_tag:
+                continue
+            depth -= 1
+            if depth == 0:
+                yield cls.__type__.from_xml(element)
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+
     def to_xml(self, tag: str = None, skip_none_field: bool = False) -> ET.Element:
         if tag is None:
             tag = self.tag
@@ -577,11 +1257,148 @@ class GenericList(UserList):
     def to_xml_bytes(self, tag: str = None, skip_none_field: bool = False, **kwargs) -> bytes:
         return ET.tostring(self.to_xml(tag, skip_none_field), **kwargs)
 
+    def to_xml_stream(self, fp, tag: str = None, skip_none_field: bool = False, encoding: str = "us-ascii"):
+        """ write the xml of items to `fp` item by item without building an element tree, the output is
+        as same as `to_xml_bytes`.
+
+        :param fp: a text or binary file object, text is encoded by `encoding` for the latter.
+        """
+        if tag is None:
+            tag = self.tag
+        if not self.data:
+            chunks = iter([f"<{tag} />"])
+        else:
+            chunks = itertools.chain([f"<{tag}>"], _iter_list_xml(self, skip_none_field), [f"</{tag}>"])
+        _write_xml_stream(fp, chunks, encoding)
+
     def __str__(self):
         return f"{self.__class__.__name__}({', '.join(str(i) for i in self)})"
 
+    def _encodable_data(self) -> List[Any]:
+        # items which can be encoded to dicts and lists
+        return self.data
+
+
+class LazyGenericList(GenericList):
+    """ a series of declared objects which are decoded at first access. the raw dicts or xml elements
+    are kept as they are given, an item is decoded when it is got by index or iteration, and replaces
+    its raw value. `len`, slicing and re-serialization of raw items don't decode anything, raw dicts
+    are written to json as they were received, and raw elements to xml.
+
+    >>> Users = new_lazy_list_type(User)
+    >>> users = Users.from_json(data)
+    >>> users[0].name
+    """
+
+    def __init__(self, initlist: List = None, tag: str = None, validate: Optional[bool] = None):
+        if not _issubclass_safe(self.__type__, Declared):
+            raise TypeError(
+                f"Type {self.__class__.__name__} cannot be intialize directly; please use new_lazy_list_type instead")
+
+        # items are not type checked, they are decoded at first access
+        UserList.__init__(self, initlist)
+        self.tag = tag
+        self.validate = validate
+
+    @classmethod
+    def from_dicts(cls: Type['LazyGenericList'],
+                   rows: Iterable[Dict[str, Any]],
+                   validate: Optional[bool] = None) -> 'LazyGenericList':
+        return cls(list(rows), validate=validate)
+
+    @classmethod
+    def from_xml(cls: Type['LazyGenericList'], element: ET.Element) -> 'LazyGenericList':
+        return cls(list(element), tag=element.tag)
+
+    @classmethod
+    def from_xml_list(cls: Type['LazyGenericList'], elements: List[ET.Element], tag) -> 'LazyGenericList':
+        return cls(list(elements), tag=tag)
+
+    def _decode(self, item):
+        if _isinstance_safe(item, self.__type__):
+            return item
+        elif _isinstance_safe(item, ET.Element):
+            return self.__type__.from_xml(item)
+        return _decode_dict_to_declared_class(self.__type__, item, self.validate)
+
+    def _decode_all(self):
+        data = self.data
+        for i, item in enumerate(data):
+            if not _isinstance_safe(item, self.__type__):
+                data[i] = self._decode(item)
+        return data
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.__class__(self.data[i], tag=self.tag, validate=self.validate)
+        item = self.data[i]
+        if not _isinstance_safe(item, self.__type__):
+            item = self.data[i] = self._decode(item)
+        return item
+
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield self[i]
+
+    def __reversed__(self):
+        for i in range(len(self.data) - 1, -1, -1):
+            yield self[i]
+
+    def __eq__(self, other):
+        self._decode_all()
+        if _isinstance_safe(other, LazyGenericList):
+            other._decode_all()
+        return super().__eq__(other)
+
+    def __str__(self):
+        # as same as the eager list type, so equal objects holding lazy and eager lists have the same hash
+        return f"{new_list_type(self.__type__).__name__}({', '.join(str(i) for i in self)})"
+
+    def __contains__(self, item):
+        return item in self._decode_all()
+
+    def count(self, item):
+        return self._decode_all().count(item)
+
+    def index(self, item, *args):
+        return self._decode_all().index(item, *args)
+
+    def remove(self, item):
+        self._decode_all().remove(item)
+
+    def pop(self, i=-1):
+        item = self[i]
+        del self.data[i]
+        return item
+
+    def sort(self, *args, **kwds):
+        self._decode_all().sort(*args, **kwds)
+
+    def copy(self):
+        return self.__class__(self.data, tag=self.tag, validate=self.validate)
+
+    def to_xml(self, tag: str = None, skip_none_field: bool = False) -> ET.Element:
+        if tag is None:
+            tag = self.tag
+        root = ET.Element(tag)
+        for item in self.data:
+            if _isinstance_safe(item, ET.Element):
+                root.append(item)
+            else:
+                root.append(self._decode(item).to_xml(skip_none_field=skip_none_field))
+        return root
+
+    def _encodable_data(self) -> List[Any]:
+        # raw dicts are encoded as they are, raw elements have to be decoded
+        data = self.data
+        for i, item in enumerate(data):
+            if _isinstance_safe(item, ET.Element):
+                data[i] = self._decode(item)
+        return data
+
 
 __created_list_types: Dict[Type, GenericList] = {}
+__created_lazy_list_types: Dict[Type, LazyGenericList] = {}
 
 
 def new_list_type(type_: Type) -> GenericList:
@@ -592,6 +1409,149 @@ def new_list_type(type_: Type) -> GenericList:
     return cls
 
 
+def new_lazy_list_type(type_: Type[Declared]) -> LazyGenericList:
+    """ create a lazy list type of a declared class, it is a subclass of `new_list_type(type_)`, so its objects can
+    be set to variables of the list type.
+    """
+    if type_ in __created_lazy_list_types:
+        return __created_lazy_list_types[type_]
+    if not _issubclass_safe(type_, Declared):
+        raise TypeError(f"Type {type_} is not a declared class, items of lazy list must be declared objects")
+    cls = type(f"LazyGenericList<{type_.__name__}>", (LazyGenericList, new_list_type(type_)), {})
+    __created_lazy_list_types[type_] = cls
+    return cls
+
+
+def _list_type_key(cls: Type[GenericList]):
+    # list types created by `new_list_type` can't be found by their names, they are pickled by their item types
+    if __created_lazy_list_types.get(cls.__type__) is cls:
+        return cls.__type__, True
+    if __created_list_types.get(cls.__type__) is cls:
+        return cls.__type__, False
+    return cls
+
+
+def _list_type_of_key(key) -> Type[GenericList]:
+    if _isinstance_safe(key, tuple):
+        type_, lazy = key
+        return new_lazy_list_type(type_) if lazy else new_list_type(type_)
+    return key
+
+
+def _restore_list(key, data: list) -> GenericList:
+    cls = _list_type_of_key(key)
+    obj = cls.__new__(cls)
+    obj.data = data
+    return obj
+
+
+_JSON_ARRAY_HEAD = r'\s*\[\s*(?=\{\s*("(?:[^"\\]|\\.)*")\s*:)'
+_XML_HEAD = (r'\s*(?:<\?.*?\?>\s*|<!--.*?-->\s*|<!DOCTYPE[^>\[]*(?:\[.*?\])?\s*>\s*)*'
+             r'<[^\s/>]+(?:[^>"\']|"[^"]*"|\'[^\']*\')*(?<!/)>\s*(?:<!--.*?-->\s*)*<([^\s/>!?]+)')
+# chunks are not split finer than this, a smaller document is decoded in the current process
+_MIN_PARALLEL_CHUNK = 1 << 20
+
+
+def _pattern(pattern: str, data: Union[str, bytes]):
+    return re.compile(pattern.encode("utf-8") if _isinstance_safe(data, (bytes, bytearray)) else pattern, re.S)
+
+
+def _text(value: Union[str, bytes]) -> str:
+    return value.decode("utf-8") if _isinstance_safe(value, bytes) else value
+
+
+def _json_array_chunks(data: JsonData):
+    """ return the head and tail of the array, and the pattern of separators before items. Items are split
+    where a comma is followed by a object beginning with the first key of the first item.
+    """
+    head = _pattern(_JSON_ARRAY_HEAD, data).match(data)
+    end = data.rstrip().rfind(b"]" if _isinstance_safe(data, (bytes, bytearray)) else "]")
+    if head is None or end < head.end():
+        return None
+    return head.end(), end, _pattern(r",(?=\s*\{\s*" + re.escape(_text(head.group(1))) + r"\s*:)", data)
+
+
+def _xml_children_chunks(data):
+    """ return the head and tail of the root element, and the pattern of starts of children. Children are
+    split where a element with the tag of the first child begins.
+    """
+    if not _isinstance_safe(data, (str, bytes, bytearray)):
+        return None
+    head = _pattern(_XML_HEAD, data).match(data)
+    end = data.rfind(b"</" if _isinstance_safe(data, (bytes, bytearray)) else "</")
+    if head is None or end < head.end():
+        return None
+    start = head.start(1) - 1
+    return start, end, _pattern("(?=<" + re.escape(_text(head.group(1))) + r"[\s/>])", data)
+
+
+def _split_chunks(data, start: int, end: int, separator, chunk_size: int) -> List[Tuple[int, int]]:
+    bounds = []
+    while end - start > chunk_size:
+        matched = separator.search(data, start + chunk_size, end)
+        if matched is None:
+            break
+        bounds.append((start, matched.start()))
+        start = matched.end()
+    bounds.append((start, end))
+    return bounds
+
+
+def _decode_list_chunk(key, method: str, document, kwargs: Dict[str, Any]) -> Optional[bytes]:
+    # runs in workers, a chunk split in the middle of a item fails to parse. The result is pickled here, like
+    # `from_dicts`, the cyclic garbage collector is paused while a lot of objects are decoded and pickled.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            result = getattr(_list_type_of_key(key), method)(document, **kwargs)
+        except (json.JSONDecodeError, ET.ParseError):
+            return None
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _picklable(cls: Type[GenericList], kwargs: Dict[str, Any]) -> bool:
+    # classes are pickled by reference, local classes and unpicklable arguments can't be sent to workers
+    try:
+        pickle.dumps((_list_type_key(cls), cls.__type__, kwargs))
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _decode_list_parallel(cls: Type[GenericList], method: str, data, find_chunks, workers: Optional[int],
+                          chunk_size: Optional[int], kwargs: Dict[str, Any]) -> GenericList:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = find_chunks(data) if workers > 1 and _picklable(cls, kwargs) else None
+    if chunks is not None:
+        start, end, separator = chunks
+        if chunk_size is None:
+            chunk_size = max((end - start) // (workers * 4), _MIN_PARALLEL_CHUNK)
+        bounds = _split_chunks(data, start, end, separator, chunk_size)
+        if len(bounds) > 1:
+            head, tail = data[:start], data[end:]
+            documents = [head + data[i:j] + tail for i, j in bounds]
+            with ProcessPoolExecutor(max_workers=min(workers, len(documents))) as executor:
+                parts = list(executor.map(_decode_list_chunk, itertools.repeat(_list_type_key(cls)),
+                                          itertools.repeat(method), documents, itertools.repeat(kwargs)))
+            if all(part is not None for part in parts):
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    result = pickle.loads(parts[0])
+                    for part in parts[1:]:
+                        result.data.extend(pickle.loads(part).data)
+                    return result
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+    return getattr(cls, method)(data, **kwargs)
+
+
 def _tuple_str(obj_name, fields):
     # Return a string representing each field of obj_name as a tuple
     # member.  So, if fields is ['x', 'y'] and obj_name is "self",
@@ -604,6 +1564,162 @@ def _tuple_str(obj_name, fields):
     return f'({",".join([f"{obj_name}.{f.name}" for f in fields])},)'
 
 
+def _create_fn(name, args, body, *, globals=None, locals=None):
+    # Note that we mutate locals when exec() is called.  Caller
+    # beware!  The only callers are internal to this module, so no
+    # worries about external callers.
+    if locals is None:
+        locals = {}
+    args = ",".join(args)
+    body = "\n".join(f"  {b}" for b in body)
+
+    # Compute the text of the entire function.
+    txt = f" def {name}({args}):\n{body}"
+
+    # Free variables in exec are resolved in the global namespace.
+    # The global namespace we have is user-provided, so we can't modify it for
+    # our purposes. So we put the things we need into locals and introduce a
+    # scope to allow the function we're creating to close over them.
+    local_vars = ", ".join(locals.keys())
+    txt = f"def __create_fn__({local_vars}):\n{txt}\n return {name}"
+    ns = {}
+    exec(txt, globals, ns)
+    return ns["__create_fn__"](**locals)
+
+
+def _is_generated_method(cls, name):
+    if name in cls.__dict__:
+        return False
+    method = getattr(cls, name, None)
+    return method is getattr(Declared, name) or getattr(method, "__declared_generated__", False)
+
+
+def _slot_of(cls, name) -> Optional[MemberDescriptorType]:
+    """ return the slot descriptor if the variable `name` is stored in `__slots__` of `cls` instances """
+    attr = getattr(cls, name, None)
+    return attr if _isinstance_safe(attr, MemberDescriptorType) else None
+
+
+def _set_qualname(cls, fn):
+    # Ensure that the functions returned from _create_fn uses the proper
+    # __qualname__ (the class they belong to).
+    fn.__qualname__ = f"{cls.__qualname__}.{fn.__name__}"
+    fn.__declared_generated__ = True
+    return fn
+
+
+def _build_init(cls: Type['Declared']):
+    # Works as same as `Declared.__init__`, for example
+    #
+    #   def __init__(self, a=_MISSING, b=_MISSING, *args, **kwargs):
+    #       _dict = self.__dict__  # or `_slot0.__set__(self, a)` for variables in slots
+    #       if a is _MISSING:
+    #           raise AttributeError(......)
+    #       _dict['a'] = a
+    #       if b is _MISSING:
+    #           b = _var1.make_default()
+    #       _dict['b'] = b
+    #       self.__post_init__()
+    #
+    # it may be reached by `super().__init__` from a subclass which writes its own `__init__`, then variables of
+    # the subclass are only known by `Declared.__init__`.
+    fs = fields(cls)
+    self_name = "__declared_self__" if "self" in cls.fields else "self"
+    locals = {"_MISSING": MISSING, "_cls": cls, "_init": Declared.__init__}
+    args = [self_name]
+    body = [
+        f"if {self_name}.__class__ is not _cls:",
+        f"  return _init({self_name}, {''.join(f'{field.name}, ' for field in fs)}*_args, **_kwargs)",
+    ]
+    if any(_slot_of(cls, field.name) is None for field in fs if field.init):
+        body.append(f"_dict = {self_name}.__dict__")
+    omits = []
+    for i, field in enumerate(fs):
+        args.append(f"{field.name}=_MISSING")
+        if not field.init:
+            omits.append(field.name)
+            continue
+
+        has_default = field.default is not MISSING or field.default_factory is not MISSING
+        if has_default:
+            make_default = "make_default" if cls.meta["validate"] else "make_default_unchecked"
+            locals[f"_var{i}"] = field
+            body.append(f"if {field.name} is _MISSING:")
+            body.append(f"  {field.name} = _var{i}.{make_default}()")
+        elif field.required:
+            message = (f"field {field.name!r} is required. if you doesn't want to init this variable in initializer, "
+                       f"please set `init` argument to False for this variable.")
+            body.append(f"if {field.name} is _MISSING:")
+            body.append(f"  raise AttributeError({message!r})")
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            body.append(f"_dict[{field.name!r}] = {field.name}")
+        else:
+            locals[f"_slot{i}"] = slot
+            body.append(f"_slot{i}.__set__({self_name}, {field.name})")
+    args.extend(["*_args", "**_kwargs"])
+
+    if omits:
+        # set `init` to False, those variables are passed to `__post_init__` instead
+        body.append("_omits = {}")
+        for name in omits:
+            body.append(f"if {name} is not _MISSING:")
+            body.append(f"  _omits[{name!r}] = {name}")
+        body.append(f"{self_name}.__post_init__(**_omits)")
+    elif cls.__post_init__ is not Declared.__post_init__:
+        body.append(f"{self_name}.__post_init__()")
+    return _set_qualname(cls, _create_fn("__init__", args, body, locals=locals))
+
+
+def _build_eq(cls: Type['Declared']):
+    fs = fields(cls)
+    body = [
+        "if other.__class__ is not self.__class__:",
+        "  return False",
+        f"return {_tuple_str('self', fs)} == {_tuple_str('other', fs)}",
+    ]
+    return _set_qualname(cls, _create_fn("__eq__", ["self", "other"], body))
+
+
+def _build_hash(cls: Type['Declared']):
+    # hash the values of fields directly, fall back to their str form when some of them are unhashable,
+    # such as list and dict.
+    fs = fields(cls)
+    str_fields = ",".join(f"str(self.{f.name})" for f in fs)
+    body = [
+        "try:",
+        f"  return hash({_tuple_str('self', fs)})",
+        "except TypeError:",
+        f"  return hash(({str_fields},))",
+    ]
+    return _set_qualname(cls, _create_fn("__hash__", ["self"], body))
+
+
+def _build_frozen_hash(cls: Type['Declared']):
+    # computes the hash as same as `_build_hash` at the first call, then it is cached in the object
+    locals = {"_hash": _build_hash(cls), "_set": object.__setattr__}
+    body = [
+        "try:",
+        "  return self.__declared_hash__",
+        "except AttributeError:",
+        "  pass",
+        "value = _hash(self)",
+        "_set(self, '__declared_hash__', value)",
+        "return value",
+    ]
+    return _set_qualname(cls, _create_fn("__hash__", ["self"], body, locals=locals))
+
+
+def _build_str(cls: Type['Declared'], name="__str__"):
+    args = ",".join(f"{var.name}={{self.{var.name}!s}}" for var in cls.meta["vars"].values())
+    body = [f"return f\"{{self.__class__.__name__}}({args})\""]
+    return _set_qualname(cls, _create_fn(name, ["self"], body))
+
+
+def _build_repr(cls: Type['Declared']):
+    return _build_str(cls, "__repr__")
+
+
 def _isinstance_safe(o, t):
     try:
         result = isinstance(o, t)
@@ -636,74 +1752,839 @@ def _is_new_type(type_):
     return inspect.isfunction(type_) and hasattr(type_, "__supertype__")
 
 
-def _decode_xml_to_declared_class(cls: Type[Declared], element: ET.Element) -> Declared:
+def _decode_xml_to_declared_class(cls: Type[Declared],
+                                  element: ET.Element,
+                                  projection: Optional['_Projection'] = None) -> Declared:
+    children = _index_xml_children(element)
+    if projection is not None:
+        # values of selected variables are cast and set by the decoder of dicts
+        kvs = {
+            field.field_name: _xml_field_value(field, element, children, projection.sub(field.name))
+            for field in fields(cls) if projection.includes(field.name)
+        }
+        return _decode_dict_to_declared_class(cls, kvs, projection=projection)
+
     init_kwargs: Dict[str, Any] = {}
     for field in fields(cls):
+        init_kwargs[field.name] = _cast_field_value(field, _xml_field_value(field, element, children))
+    return cls(**init_kwargs)
+
+
+def _index_xml_children(element: ET.Element) -> Dict[str, List[ET.Element]]:
+    # group children by tag in one pass, instead of scanning all of them to find each variable
+    children: Dict[str, List[ET.Element]] = {}
+    for child in element:
+        subs = children.get(child.tag)
+        if subs is None:
+            children[child.tag] = [child]
+        else:
+            subs.append(child)
+    return children
+
+
+def _xml_field_value(field: Var,
+                     element: ET.Element,
+                     children: Dict[str, List[ET.Element]],
+                     projection: Optional['_Projection'] = None):
+    # a variable whose node is absent is MISSING, then it is set to its default value, or reported as required
+    if field.as_xml_attr:
+        return element.get(field.field_name, MISSING)
+    elif field.as_xml_text:
+        return element.text
+
+    subs = children.get(field.field_name)
+    if _issubclass_safe(field.type_, GenericList):
+        subs = subs or []
+        if projection is not None:
+            item_type = field.type_.__type__
+            return field.type_((_decode_xml_to_declared_class(item_type, sub, projection) for sub in subs),
+                               tag=element.tag)
+        return field.type_.from_xml_list(subs, element.tag)
+    elif not subs:
+        return MISSING
+    elif _issubclass_safe(field.type_, Declared):
+        if projection is not None:
+            return _decode_xml_to_declared_class(field.type_, subs[0], projection)
+        return field.type_.from_xml(subs[0])
+    else:
+        return subs[0].text
+
+
+def _iter_declared_xml(obj: Declared, skip_none_field: bool = False) -> Iterator[str]:
+    # yields the xml of `ET.tostring(obj.to_xml())` piece by piece, nested objects are written recursively
+    tag = obj.__xml_tag_name__ if obj.__xml_tag_name__ else obj.__class__.__name__.lower()
+    attrs = []
+    text = None
+    children = []
+    for field in fields(obj):
         if field.as_xml_attr:
-            field_value = element.get(field.field_name, MISSING)
+            value = getattr(obj, field.name, None)
+            if value:
+                attrs.append(f' {field.field_name}="{_escape_xml_attrib(value)}"')
         elif field.as_xml_text:
-            field_value = element.text
-        elif _issubclass_safe(field.type_, GenericList):
-            subs = element.findall(field.field_name)
-            field_value = field.type_.from_xml_list(subs, element.tag)
-        elif _issubclass_safe(field.type_, Declared):
-            sub = element.find(field.field_name)
-            if sub is None:
-                sub = MISSING
-            field_value = field.type_.from_xml(sub)
+            value = getattr(obj, field.name, None)
+            if value is not None and value is not MISSING:
+                text = value
         else:
-            field_value = element.find(field.field_name).text
-        init_kwargs[field.name] = _cast_field_value(field, field_value)
-    return cls(**init_kwargs)
+            value = getattr(obj, field.name, None)
+            if value is None or value is MISSING:
+                continue
+            if _issubclass_safe(field.type_, (GenericList, Declared)):
+                if not _isinstance_safe(value, GenericList) or value:
+                    children.append(value)
+            else:
+                children.append((field.field_name, value))
+
+    # an element without text and children is written in short, as same as ElementTree does
+    if not text and not children:
+        yield f"<{tag}{''.join(attrs)} />"
+        return
+    yield f"<{tag}{''.join(attrs)}>"
+    if text:
+        yield _escape_xml_text(text)
+    for child in children:
+        if _isinstance_safe(child, GenericList):
+            yield from _iter_list_xml(child, skip_none_field)
+        elif _isinstance_safe(child, Declared):
+            yield from _iter_declared_xml(child, skip_none_field)
+        else:
+            name, value = child
+            yield f"<{name}>{_escape_xml_text(value)}</{name}>" if value else f"<{name} />"
+    yield f"</{tag}>"
 
 
-def _decode_dict_to_declared_class(cls: Type[Declared], kvs: Union['List', 'Dict']):
-    if _isinstance_safe(kvs, cls):
-        return kvs
+def _iter_list_xml(items: GenericList, skip_none_field: bool = False) -> Iterator[str]:
+    for i, item in enumerate(items.data):
+        if _isinstance_safe(item, ET.Element):
+            # raw elements of lazy list
+            yield ET.tostring(item, encoding="unicode")
+        else:
+            yield from _iter_declared_xml(items[i], skip_none_field)
 
-    if not kvs:
-        if _issubclass_safe(cls, Declared):
-            return cls.__new__(cls)
-        return cls()
 
-    init_kwargs: Dict[str, Any] = {}
-    for field in fields(cls):
-        field_value = kvs.get(field.field_name, MISSING)
-        if field_value is MISSING:
-            field_value = field.make_default()
+def _write_xml_stream(fp, chunks: Iterable[str], encoding: str = "us-ascii", chunk_size: int = 65536):
+    binary = _isinstance_safe(fp, (io.RawIOBase, io.BufferedIOBase))
 
-        init_kwargs[field.name] = _cast_field_value(field, field_value)
+    def write(text):
+        fp.write(text.encode(encoding, "xmlcharrefreplace") if binary else text)
 
-    return cls(**init_kwargs)
+    if binary and encoding.lower() not in ("utf-8", "us-ascii"):
+        write(f"<?xml version='1.0' encoding='{encoding}'?>\n")
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            write("".join(parts))
+            parts.clear()
+            size = 0
+    write("".join(parts))
 
 
-def _cast_field_value(field: Var, field_value: Any):
-    if field_value is MISSING:
+_escape_xml_attrib = ET._escape_attrib
+_escape_xml_text = custom_escape_cdata
+
+
+def _decode_dict_to_declared_class(cls: Type[Declared],
+                                   kvs: Union['List', 'Dict'],
+                                   validate: Optional[bool] = None,
+                                   lazy: bool = False,
+                                   projection: Optional['_Projection'] = None):
+    if validate is None:
+        validate = cls.meta["validate"]
+    if projection is not None or (lazy and _lazy_fields(cls)):
+        return _declared_partial_decoder(cls, validate, lazy, projection)(kvs)
+    return _declared_decoder(cls, validate)(kvs)
+
+
+def _declared_decoder(cls: Type[Declared], validate: bool = True) -> Callable[[Any], Declared]:
+    """ Return the decoder compiled for `cls`, build it at first use.
+
+    It is not built in `BaseDeclared.__new__` because the type of a variable may be a str
+    of a class which is declared later, it can only be resolved when decoding starts.
+    """
+    if validate:
+        return _compiled_function(cls, "__declared_decoder__", _build_decoder)
+    return _compiled_function(cls, "__declared_unchecked_decoder__", partial(_build_decoder, validate=False))
+
+
+def _declared_partial_decoder(cls: Type[Declared],
+                              validate: bool = True,
+                              lazy: bool = False,
+                              projection: Optional['_Projection'] = None) -> Callable[[Any], Declared]:
+    """ Return the decoder compiled for `cls` which leaves some variables raw or unset, build it at first use. """
+    decoders = cls.__dict__.get("__declared_partial_decoders__")
+    if decoders is None:
+        decoders = {}
+        setattr(cls, "__declared_partial_decoders__", decoders)
+    key = (validate, lazy, projection)
+    decoder = decoders.get(key)
+    if decoder is None:
+        decoder = decoders[key] = _build_partial_decoder(cls, validate, lazy, projection)
+    return decoder
+
+
+def _lazy_fields(cls: Type[Declared]) -> List[Var]:
+    """ variables of `cls` whose values can be left raw by lazy decoding """
+    lazy_fields = cls.__dict__.get("__declared_lazy_fields__")
+    if lazy_fields is None:
+        lazy_fields = []
+        init = cls.__init__
+        # the raw values are kept in `__dict__` of objects, and objects are built without `__init__`
+        if cls.__dictoffset__ and (init is Declared.__init__ or getattr(init, "__declared_generated__", False)):
+            lazy_fields = [
+                field for field in fields(cls)
+                if _issubclass_safe(field.type_, (Declared, GenericList)) and _slot_of(cls, field.name) is None
+            ]
+        setattr(cls, "__declared_lazy_fields__", lazy_fields)
+    return lazy_fields
+
+
+class _RawFields(dict):
+    """ raw values of variables which are left by lazy decoding, keyed by variable name """
+
+    __slots__ = ("validate", "projection")
+
+    def __init__(self, validate: bool = True, projection: Optional['_Projection'] = None):
+        super().__init__()
+        self.validate = validate
+        self.projection = projection
+
+    def decode(self, field: Var):
+        return _partial_caster(field, self.validate, True, self.projection)(self.pop(field.name))
+
+
+class _Projection:
+    """ variables selected by paths of `only` and `exclude`, the paths are kept as trees of names,
+    such as `{"a": None, "b": {"c": None}}` for paths "a" and "b.c".
+    """
+
+    __slots__ = ("only", "exclude", "_key")
+
+    def __init__(self, only: Optional[Dict[str, Any]] = None, exclude: Optional[Dict[str, Any]] = None):
+        self.only = only
+        self.exclude = exclude
+        self._key = (_freeze_paths(only), _freeze_paths(exclude))
+
+    @classmethod
+    def parse(cls, only: Optional[Iterable[str]], exclude: Optional[Iterable[str]]) -> Optional['_Projection']:
+        if only is None and exclude is None:
+            return None
+        return cls(_parse_paths(only), _parse_paths(exclude))
+
+    def includes(self, name: str) -> bool:
+        if self.only is not None and name not in self.only:
+            return False
+        return self.exclude is None or name not in self.exclude or self.exclude[name] is not None
+
+    def sub(self, name: str) -> Optional['_Projection']:
+        """ the projection of variables of the nested variable `name`, None if all of them are selected """
+        only = self.only.get(name) if self.only is not None else None
+        exclude = self.exclude.get(name) if self.exclude is not None else None
+        if only is None and exclude is None:
+            return None
+        return _Projection(only, exclude)
+
+    def check(self, cls: Type[Declared]):
+        for paths in (self.only, self.exclude):
+            for name, sub_paths in (paths or {}).items():
+                if name not in cls.meta["vars"]:
+                    raise ValueError(f"{cls.__name__} has no variable {name!r}")
+                if sub_paths is None:
+                    continue
+                type_ = cls.meta["vars"][name].type_
+                if _issubclass_safe(type_, GenericList):
+                    type_ = type_.__type__
+                if not _issubclass_safe(type_, Declared):
+                    raise ValueError(f"variable {name!r} of {cls.__name__} is not a declared class or list of them")
+
+        for name in cls.fields:
+            sub = self.sub(name)
+            if sub is not None:
+                type_ = cls.meta["vars"][name].type_
+                sub.check(type_.__type__ if _issubclass_safe(type_, GenericList) else type_)
+
+    def __eq__(self, other):
+        return isinstance(other, _Projection) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+
+def _parse_paths(paths: Optional[Iterable[str]]) -> Optional[Dict[str, Any]]:
+    if paths is None:
+        return None
+    if isinstance(paths, str):
+        paths = [paths]
+
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        *parents, name = path.split(".")
+        for parent in parents:
+            if parent in node and node[parent] is None:
+                # the whole variable has been selected
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[name] = None
+    return tree
+
+
+def _freeze_paths(tree: Optional[Dict[str, Any]]):
+    if tree is None:
+        return None
+    return frozenset((name, _freeze_paths(sub)) for name, sub in tree.items())
+
+
+def _partial_caster(field: Var,
+                    validate: bool = True,
+                    lazy: bool = False,
+                    projection: Optional[_Projection] = None) -> Callable[[Any], Any]:
+    # nested objects of a object decoded partially are decoded partially too, nested objects are decoded with
+    # the validate class option of their own classes, as same as casters
+    sub = projection.sub(field.name) if projection is not None else None
+    type_ = field.type_
+    nested_validate = None if validate else False
+    if _issubclass_safe(type_, Declared) and (lazy or sub is not None):
+        return partial(_decode_dict_to_declared_class, type_, validate=nested_validate, lazy=lazy, projection=sub)
+    if sub is not None and _issubclass_safe(type_, GenericList):
+        return partial(_cast_partial_list, type_, validate=nested_validate, lazy=lazy, projection=sub)
+    if lazy and _issubclass_safe(type_, GenericList) and _issubclass_safe(type_.__type__, Declared) \
+            and new_list_type(type_.__type__) is type_:
+        # the lazy list type is a subclass of the list type
+        return partial(_cast_declared_list, new_lazy_list_type(type_.__type__), validate=nested_validate)
+    return field.caster if validate else _unchecked_caster(field)
+
+
+def _cast_partial_list(type_, field_value, validate: Optional[bool] = None, lazy: bool = False, projection=None):
+    if isinstance(field_value, type_):
         return field_value
+    # look up the decoder of items once for the whole list
+    item_type = type_.__type__
+    decoder = _declared_partial_decoder(
+        item_type, item_type.meta["validate"] if validate is None else validate, lazy, projection)
+    return type_([decoder(item) for item in field_value])
+
 
-    if _issubclass_safe(field.type_, Declared):
-        value = _decode_dict_to_declared_class(field.type_, field_value)
-    elif _issubclass_safe(field.type_, Decimal):
-        value = field_value if isinstance(field_value, Decimal) else Decimal(field_value)
-    elif _issubclass_safe(field.type_, UUID):
-        value = field_value if isinstance(field_value, UUID) else UUID(field_value)
-    elif _issubclass_safe(field.type_, datetime):
-        if _isinstance_safe(field_value, datetime):
-            dt = field_value
+def _declared_constructor(cls: Type[Declared]) -> Callable[..., Declared]:
+    """ Return the constructor without checks compiled for `cls`, build it at first use. """
+    return _compiled_function(cls, "__declared_constructor__", _build_constructor)
+
+
+def _compiled_function(cls, name, build):
+    # look up in `__dict__` of the class, a subclass must not reuse the function compiled for its base
+    try:
+        return cls.__dict__[name]
+    except KeyError:
+        function = build(cls)
+        setattr(cls, name, function)
+        return function
+
+
+def _build_decoder(cls: Type[Declared], validate: bool = True) -> Callable[[Any], Declared]:
+    # The generated function unrolls the loop of fields, for example
+    #
+    #   def __declared_decode__(kvs):
+    #       if isinstance(kvs, _cls):
+    #           return kvs
+    #       if not kvs:
+    #           return _cls.__new__(_cls)
+    #       _get = kvs.get
+    #       _v0 = _get('na', _MISSING)
+    #       if _v0 is not _MISSING:
+    #           _v0 = _cast0(_v0)
+    #       ......
+    #       return _cls(a=_v0, ......)
+    #
+    # without validation, the object is built by `_construct` instead of `_cls`, and nested objects
+    # are decoded without validation too.
+    locals = {"_cls": cls, "_MISSING": MISSING}
+    body = [
+        "if isinstance(kvs, _cls):",
+        "  return kvs",
+        "if not kvs:",
+        "  return _cls.__new__(_cls)",
+        "_get = kvs.get",
+    ]
+    make_default = "make_default" if validate else "make_default_unchecked"
+    init_args = []
+    for i, field in enumerate(fields(cls)):
+        value_name = f"_v{i}"
+        locals[f"_var{i}"] = field
+        locals[f"_cast{i}"] = field.caster if validate else _unchecked_caster(field)
+        body.append(f"{value_name} = _get({field.field_name!r}, _MISSING)")
+        if field.default is not MISSING or field.default_factory is not MISSING:
+            body.append(f"if {value_name} is _MISSING:")
+            body.append(f"  {value_name} = _var{i}.{make_default}()")
+        body.append(f"if {value_name} is not _MISSING:")
+        body.append(f"  {value_name} = _cast{i}({value_name})")
+        init_args.append(f"{field.name}={value_name}")
+    if validate:
+        body.append(f"return _cls({', '.join(init_args)})")
+    else:
+        locals["_construct"] = _declared_constructor(cls)
+        body.append(f"return _construct({', '.join(init_args)})")
+    return _create_fn("__declared_decode__", ["kvs"], body, locals=locals)
+
+
+def _build_partial_decoder(cls: Type[Declared],
+                           validate: bool = True,
+                           lazy: bool = False,
+                           projection: Optional[_Projection] = None) -> Callable[[Any], Declared]:
+    # Works as same as `__declared_decode__` and `__init__`, but the raw values of nested variables are kept
+    # in `__declared_raw__` of the object if `lazy`, and variables which aren't selected by `projection` are
+    # skipped, for example
+    #
+    #   def __declared_partial_decode__(kvs):
+    #       if isinstance(kvs, _cls):
+    #           return kvs
+    #       if not kvs:
+    #           return _cls.__new__(_cls)
+    #       _get = kvs.get
+    #       _raw = _RawFields(True, _projection)
+    #       _v0 = _get('a', _MISSING)
+    #       if _v0 is not _MISSING:
+    #           _v0 = _cast0(_v0)
+    #       _v1 = _get('b', _MISSING)
+    #       if _v1 is not _MISSING and not isinstance(_v1, _type1):
+    #           _raw['b'] = _v1
+    #           _v1 = _MISSING
+    #       ......
+    #       self = _new(_cls)
+    #       _dict = self.__dict__  # or `_slot0.__set__(self, _v0)` for variables in slots
+    #       _dict['a'] = _v0
+    #       if 'b' not in _raw:
+    #           _dict['b'] = _v1
+    #       if _raw:
+    #           _dict['__declared_raw__'] = _raw
+    #       self.__post_init__()
+    #       return self
+    #
+    # without validation, the object is built as same as `construct`.
+    if projection is not None:
+        projection.check(cls)
+    fs = [field for field in fields(cls) if projection is None or projection.includes(field.name)]
+    lazy_fields = _lazy_fields(cls) if lazy else []
+    locals = {
+        "_cls": cls,
+        "_MISSING": MISSING,
+        "_new": object.__new__,
+        "_RawFields": _RawFields,
+        "_projection": projection,
+    }
+    body = [
+        "if isinstance(kvs, _cls):",
+        "  return kvs",
+        "if not kvs:",
+        "  return _cls.__new__(_cls)",
+        "_get = kvs.get",
+    ]
+    if lazy_fields:
+        body.append(f"_raw = _RawFields({validate}, _projection)")
+    make_default = "make_default" if validate else "make_default_unchecked"
+    self_name = "__declared_self__" if "self" in cls.fields else "self"
+    stores = [f"{self_name} = _new(_cls)"]
+    if lazy_fields or any(_slot_of(cls, field.name) is None for field in fs):
+        stores.append(f"_dict = {self_name}.__dict__")
+    omits = []
+    for i, field in enumerate(fs):
+        value_name = f"_v{i}"
+        has_default = field.default is not MISSING or field.default_factory is not MISSING
+        deferred = field in lazy_fields and (field.init or not validate)
+        locals[f"_var{i}"] = field
+        locals[f"_cast{i}"] = _partial_caster(field, validate, lazy, projection)
+        body.append(f"{value_name} = _get({field.field_name!r}, _MISSING)")
+        if deferred:
+            locals[f"_type{i}"] = field.type_
+            body.append(f"if {value_name} is not _MISSING and not isinstance({value_name}, _type{i}):")
+            body.append(f"  _raw[{field.name!r}] = {value_name}")
+            body.append(f"  {value_name} = _MISSING")
+            if has_default:
+                body.append(f"elif {value_name} is _MISSING:")
+                body.append(f"  {value_name} = _var{i}.{make_default}()")
+        elif has_default:
+            body.append(f"if {value_name} is _MISSING:")
+            body.append(f"  {value_name} = _var{i}.{make_default}()")
+        body.append(f"if {value_name} is not _MISSING:")
+        body.append(f"  {value_name} = _cast{i}({value_name})")
+
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            store = f"_dict[{field.name!r}] = {value_name}"
+        else:
+            locals[f"_slot{i}"] = slot
+            store = f"_slot{i}.__set__({self_name}, {value_name})"
+        if not validate:
+            # as same as `construct`, only values which are present are set, and MISSING for optional variables
+            if field.init and not field.required:
+                store = f"if {field.name!r} not in _raw:\n  {store}" if deferred else store
+                stores.extend(store.split("\n"))
+            else:
+                stores.append(f"if {value_name} is not _MISSING:")
+                stores.append(f"  {store}")
+            continue
+
+        # as same as `__init__`
+        if not field.init:
+            omits.append((field.name, value_name))
+            continue
+        if field.required and not has_default:
+            message = (f"field {field.name!r} is required. if you doesn't want to init this variable in initializer, "
+                       f"please set `init` argument to False for this variable.")
+            condition = f"{value_name} is _MISSING" + (f" and {field.name!r} not in _raw" if deferred else "")
+            body.append(f"if {condition}:")
+            body.append(f"  raise AttributeError({message!r})")
+        if deferred:
+            stores.append(f"if {field.name!r} not in _raw:")
+            stores.append(f"  {store}")
+        else:
+            stores.append(store)
+    body.extend(stores)
+    if lazy_fields:
+        body.append("if _raw:")
+        body.append("  _dict['__declared_raw__'] = _raw")
+    if validate:
+        if omits:
+            body.append("_omits = {}")
+            for name, value_name in omits:
+                body.append(f"if {value_name} is not _MISSING:")
+                body.append(f"  _omits[{name!r}] = {value_name}")
+            body.append(f"{self_name}.__post_init__(**_omits)")
+        elif cls.__post_init__ is not Declared.__post_init__:
+            body.append(f"{self_name}.__post_init__()")
+    body.append(f"return {self_name}")
+    return _create_fn("__declared_partial_decode__", ["kvs"], body, locals=locals)
+
+
+def _build_constructor(cls: Type[Declared]) -> Callable[..., Declared]:
+    # Works as same as `__init__` without any check, for example
+    #
+    #   def __declared_construct__(a=_MISSING, b=_MISSING, c=_MISSING, **_kwargs):
+    #       self = _new(_cls)
+    #       _dict = self.__dict__  # or `_slot0.__set__(self, a)` for variables in slots
+    #       if a is not _MISSING:
+    #           _dict['a'] = a
+    #       if b is _MISSING:
+    #           b = _var1.make_default_unchecked()
+    #       _dict['b'] = b
+    #       _dict['c'] = c
+    #       return self
+    #
+    # optional variables without defaults are set to MISSING as same as `__init__` does, so objects built in both
+    # ways are equal. required variables are left unset.
+    fs = fields(cls)
+    self_name = "__declared_self__" if "self" in cls.fields else "self"
+    locals = {"_cls": cls, "_new": object.__new__, "_MISSING": MISSING}
+    args = [f"{field.name}=_MISSING" for field in fs] + ["**_kwargs"]
+    body = [f"{self_name} = _new(_cls)"]
+    if any(_slot_of(cls, field.name) is None for field in fs):
+        body.append(f"_dict = {self_name}.__dict__")
+    for i, field in enumerate(fs):
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            store = f"_dict[{field.name!r}] = {field.name}"
+        else:
+            locals[f"_slot{i}"] = slot
+            store = f"_slot{i}.__set__({self_name}, {field.name})"
+
+        if field.default is not MISSING or field.default_factory is not MISSING:
+            locals[f"_var{i}"] = field
+            body.append(f"if {field.name} is _MISSING:")
+            body.append(f"  {field.name} = _var{i}.make_default_unchecked()")
+            body.append(store)
+        elif field.init and not field.required:
+            body.append(store)
         else:
-            tz = datetime.now(timezone.utc).astimezone().tzinfo
-            dt = datetime.fromtimestamp(field_value, tz=tz)
-        value = dt
-    elif type(field_value) != field.type_ and field.auto_cast and field:
+            body.append(f"if {field.name} is not _MISSING:")
+            body.append(f"  {store}")
+    body.append(f"return {self_name}")
+    return _create_fn("__declared_construct__", args, body, locals=locals)
+
+
+def _declared_state_getter(cls: Type[Declared]) -> Callable[[Declared], Tuple[tuple, Optional[dict]]]:
+    """ Return the function getting values of variables for pickling compiled for `cls`, build it at first use. """
+    return _compiled_function(cls, "__declared_state__", _build_state_getter)
+
+
+def _declared_restorer(cls: Type[Declared]) -> Callable[..., Declared]:
+    """ Return the function restoring values of variables by pickling compiled for `cls`, build it at first use. """
+    return _compiled_function(cls, "__declared_restore__", _build_restorer)
+
+
+def _restore_declared(cls: Type[Declared], values: tuple) -> Declared:
+    return _declared_restorer(cls)(*values)
+
+
+def _replace_declared(obj: Declared, changes: Dict[str, Any]) -> Declared:
+    # values are read and written as same as pickling, so raw values of lazy decoding are decoded, and the caches
+    # of frozen objects are not copied
+    cls = obj.__class__
+    values, extra = _declared_state_getter(cls)(obj)
+    if changes:
+        values = list(values)
+        meta_vars = cls.meta["vars"]
+        validate = cls.meta["validate"]
+        for name, value in changes.items():
+            meta_var = meta_vars.get(name)
+            if meta_var is None:
+                raise TypeError(f"{cls.__name__}.replace() got an unexpected variable {name!r}")
+            if validate:
+                meta_var.check(value)
+            values[cls.fields.index(name)] = value
+    new = _declared_restorer(cls)(*values)
+    if extra:
+        new.__dict__.update(extra)
+    return new
+
+
+def _build_state_getter(cls: Type[Declared]) -> Callable[[Declared], Tuple[tuple, Optional[dict]]]:
+    # The generated function reads variables in order of fields, for example
+    #
+    #   def __declared_state__(obj):
+    #       _dict = obj.__dict__
+    #       return (_dict.get('a', _UNSET), ......), (None if _names.issuperset(_dict) else _extra(_dict, _names))
+    #
+    # variables which are not set are taken as _UNSET, raw values of lazy decoding are decoded first, and other
+    # attributes in `__dict__` are kept as the state of pickling.
+    fs = fields(cls)
+    locals = {"_UNSET": _UNSET, "_names": frozenset(cls.fields) | {"__declared_raw__", *_FROZEN_CACHES}}
+    body = []
+    values = []
+    has_dict = cls.__dictoffset__ != 0
+    if has_dict:
+        body.append("_dict = obj.__dict__")
+    if _lazy_fields(cls):
+        body.append("_raw = _dict.get('__declared_raw__')")
+        body.append("if _raw:")
+        body.append("  for _name in list(_raw):")
+        body.append("    getattr(obj, _name)")
+    for i, field in enumerate(fs):
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            values.append(f"_dict.get({field.name!r}, _UNSET)")
+        else:
+            locals[f"_slot{i}"] = slot
+            body.append("try:")
+            body.append(f"  _v{i} = _slot{i}.__get__(obj)")
+            body.append("except AttributeError:")
+            body.append(f"  _v{i} = _UNSET")
+            values.append(f"_v{i}")
+    values = f"({', '.join(values)}{',' if len(values) == 1 else ''})"
+    if has_dict:
+        locals["_extra"] = _extra_attributes
+        body.append(f"return {values}, (None if _names.issuperset(_dict) else _extra(_dict, _names))")
+    else:
+        body.append(f"return {values}, None")
+    return _create_fn("__declared_state__", ["obj"], body, locals=locals)
+
+
+def _extra_attributes(attributes: dict, names: frozenset) -> dict:
+    return {k: v for k, v in attributes.items() if k not in names}
+
+
+def _build_restorer(cls: Type[Declared]) -> Callable[..., Declared]:
+    # Works as same as `_build_constructor`, but all arguments are positional, values of variables which were not
+    # set are _UNSET, and MISSING values set by `__init__` are stored as they are, for example
+    #
+    #   def __declared_restore__(a, b):
+    #       self = _new(_cls)
+    #       _dict = self.__dict__  # or `_slot0.__set__(self, a)` for variables in slots
+    #       if a is not _UNSET:
+    #           _dict['a'] = a
+    #       if b is _MISSING or b is _UNSET:
+    #           b = _var1.make_default_unchecked()
+    #       _dict['b'] = b
+    #       return self
+    fs = fields(cls)
+    args = [f"_v{i}" for i in range(len(fs))]
+    locals = {"_cls": cls, "_new": object.__new__, "_MISSING": MISSING, "_UNSET": _UNSET}
+    body = ["_self = _new(_cls)"]
+    if any(_slot_of(cls, field.name) is None for field in fs):
+        body.append("_dict = _self.__dict__")
+    for i, field in enumerate(fs):
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            store = f"_dict[{field.name!r}] = _v{i}"
+        else:
+            locals[f"_slot{i}"] = slot
+            store = f"_slot{i}.__set__(_self, _v{i})"
+
+        if field.default is not MISSING or field.default_factory is not MISSING:
+            locals[f"_var{i}"] = field
+            body.append(f"if _v{i} is _MISSING or _v{i} is _UNSET:")
+            body.append(f"  _v{i} = _var{i}.make_default_unchecked()")
+            body.append(store)
+        else:
+            body.append(f"if _v{i} is not _UNSET:")
+            body.append(f"  {store}")
+    body.append("return _self")
+    return _create_fn("__declared_restore__", args, body, locals=locals)
+
+
+def _unchecked_caster(field: Var) -> Callable[[Any], Any]:
+    # nested objects of a object decoded without validation are decoded without validation too
+    cast = field.caster
+    if _isinstance_safe(cast, partial) and cast.func in (_decode_dict_to_declared_class, _cast_declared_list):
+        return partial(cast.func, *cast.args, validate=False)
+    return cast
+
+
+def _cast_field_value(field: Var, field_value: Any):
+    if field_value is MISSING:
+        return field_value
+    return field.caster(field_value)
+
+
+def _make_caster(field: Var) -> Callable[[Any], Any]:
+    type_ = field.type_
+    if _issubclass_safe(type_, Declared):
+        return partial(_decode_dict_to_declared_class, type_)
+    elif _issubclass_safe(type_, Decimal):
+        return _cast_decimal
+    elif _issubclass_safe(type_, UUID):
+        return _cast_uuid
+    elif _issubclass_safe(type_, datetime):
+        return _cast_datetime
+    elif not field.auto_cast:
+        return _cast_nothing
+    elif _issubclass_safe(type_, GenericList) and _issubclass_safe(type_.__type__, Declared):
+        return partial(_cast_declared_list, type_)
+
+    def cast(field_value):
+        if type(field_value) == type_:
+            return field_value
         try:
-            value = field.type_(field_value)
+            value = type_(field_value)
         except ValueError as why:
             raise ValueError(
-                f"{why}: field {field.name} does't support cast type {type(field_value)}({field_value!r}) to {field.type_},"
+                f"{why}: field {field.name} does't support cast type {type(field_value)}({field_value!r}) to {type_},"
                 f"if you want to avoid this cast in here just turn off `auto_cast` when you define this variable.")
-    else:
-        value = field_value
-    return value
+        if _profiler is not None:
+            _profiler.count_cast(field)
+        return value
+
+    return cast
+
+
+def _cast_decimal(field_value):
+    return field_value if isinstance(field_value, Decimal) else Decimal(field_value)
+
+
+def _cast_uuid(field_value):
+    return field_value if isinstance(field_value, UUID) else UUID(field_value)
+
+
+def _cast_datetime(field_value):
+    if _isinstance_safe(field_value, datetime):
+        return field_value
+    tz = datetime.now(timezone.utc).astimezone().tzinfo
+    return datetime.fromtimestamp(field_value, tz=tz)
+
+
+def _cast_nothing(field_value):
+    return field_value
+
+
+def _cast_declared_list(type_, field_value, validate: Optional[bool] = None):
+    return field_value if isinstance(field_value, type_) else type_.from_dicts(field_value, validate)
+
+
+def _decode_column(cls: Type[Declared], column: List[Any], validate: Optional[bool] = None) -> List[Any]:
+    # decode non empty dicts in bulk, others such as MISSING or instances are handled value by value
+    if validate is None:
+        validate = cls.meta["validate"]
+
+    result = list(column)
+    rows = []
+    indexes = []
+    for i, value in enumerate(column):
+        if type(value) is dict and value:
+            rows.append(value)
+            indexes.append(i)
+        elif value is not MISSING:
+            result[i] = _decode_dict_to_declared_class(cls, value, validate)
+
+    for i, obj in zip(indexes, _decode_rows(cls, rows, validate)):
+        result[i] = obj
+    return result
+
+
+def _decode_rows(cls: Type[Declared], rows: List[Dict[str, Any]], validate: bool = True) -> List[Declared]:
+    if not cls.fields:
+        return [cls() if validate else cls.construct() for _ in rows]
+
+    names = []
+    columns = []
+    for field in fields(cls):
+        key = field.field_name
+        column = [row.get(key, MISSING) for row in rows]
+        if field.default is not MISSING:
+            default = field.make_default() if validate else field.default
+            column = [default if value is MISSING else value for value in column]
+        elif field.default_factory is not MISSING:
+            make_default = field.make_default if validate else field.make_default_unchecked
+            column = [make_default() if value is MISSING else value for value in column]
+        names.append(field.name)
+        columns.append(_cast_column(field, column, validate))
+
+    if not validate:
+        construct = _declared_constructor(cls)
+        return [construct(*values) for values in zip(*columns)]
+
+    init = cls.__init__
+    if init is Declared.__init__ or getattr(init, "__declared_generated__", False):
+        # both of them take variables by position in order of fields
+        return [cls(*values) for values in zip(*columns)]
+    return [cls(**dict(zip(names, values))) for values in zip(*columns)]
+
+
+def _cast_column(field: Var, column: List[Any], validate: bool = True) -> List[Any]:
+    type_ = field.type_
+    cast = field.caster if validate else _unchecked_caster(field)
+    if _issubclass_safe(type_, Declared):
+        return _decode_column(type_, column, None if validate else False)
+    elif cast is _cast_nothing:
+        return column
+    elif cast is _cast_datetime:
+        # resolve local timezone once for the whole column
+        tz = datetime.now(timezone.utc).astimezone().tzinfo
+        return [
+            value if value is MISSING or _isinstance_safe(value, datetime) else datetime.fromtimestamp(value, tz=tz)
+            for value in column
+        ]
+    elif all(type(value) is type_ for value in column):
+        return column
+    # mixed type column
+    return [value if value is MISSING else cast(value) for value in column]
+
+
+def _iter_lines(source):
+    # file objects yield lines already
+    if hasattr(source, "readline"):
+        yield from source
+        return
+
+    pending = []
+    for chunk in source:
+        newline = "\n" if _isinstance_safe(chunk, str) else b"\n"
+        start = 0
+        index = chunk.find(newline)
+        while index >= 0:
+            pending.append(chunk[start:index])
+            yield chunk[:0].join(pending)
+            pending = []
+            start = index + 1
+            index = chunk.find(newline, start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    if pending:
+        yield pending[0][:0].join(pending)
+
+
+def _decode_jsonl(cls: Type[Declared], lines: bytes) -> List[Declared]:
+    return list(cls.iter_jsonl((lines,)))
 
 
 def _is_declared_instance(obj):
@@ -761,32 +2642,608 @@ def _user_overrides(cls):
     return overrides
 
 
-def _asdict(obj, encode_json=False, skip_none_field=False):
-    if _is_declared_instance(obj):
-        result = []
-        field: Var
-        for field in fields(obj):
-            if field.ignore_serialize:
-                continue
+def _declared_encoder(cls: Type[Declared]) -> Callable[[Declared, bool, bool], Dict[str, Any]]:
+    """ Return the encoder compiled for `cls`, build it at first use. """
+    return _compiled_function(cls, "__declared_encoder__", _build_encoder)
+
+
+def _build_encoder(cls: Type[Declared]) -> Callable[[Declared, bool, bool], Dict[str, Any]]:
+    # The generated function unrolls the loop of fields and writes straight into the result, for example
+    #
+    #   def __declared_encode__(obj, encode_json, skip_none_field, copy_value):
+    #       _get = obj.__dict__.get
+    #       result = {}
+    #       _v0 = _get('a', _MISSING)  # or `_slot0.__get__(obj)` for variables in slots
+    #       if _v0 is _MISSING:
+    #           raise AttributeError("field a is required.")
+    #       if _v0 is None:
+    #           if not skip_none_field:
+    #               result['a'] = None
+    #       elif type(_v0) is _type0:
+    #           result['a'] = _v0
+    #       else:
+    #           result['a'] = _encode_field_value(_v0, encode_json, skip_none_field, copy_value)
+    #       ......
+    #       return result
+    locals = {
+        "_MISSING": MISSING,
+        "_Declared": Declared,
+        "_encode_field_value": _encode_field_value,
+        "_encode_declared": _encode_declared,
+        "_encode_list": _encode_list,
+        "_encode_json_type": _encode_json_type,
+    }
+    fs = [field for field in fields(cls) if not field.ignore_serialize]
+    lazy_fields = _lazy_fields(cls)
+    body = ["result = {}"]
+    if any(_slot_of(cls, field.name) is None for field in fs):
+        body.append("_get = obj.__dict__.get")
+    if any(field in lazy_fields for field in fs):
+        locals["_copy_raw"] = _copy_raw
+        body.append("_raw = _get('__declared_raw__')")
+    for i, field in enumerate(fs):
+        value_name = f"_v{i}"
+        key = repr(field.field_name)
+        locals[f"_var{i}"] = field
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            body.append(f"{value_name} = _get({field.name!r}, _MISSING)")
+        else:
+            locals[f"_slot{i}"] = slot
+            body.append("try:")
+            body.append(f"  {value_name} = _slot{i}.__get__(obj)")
+            body.append("except AttributeError:")
+            body.append(f"  {value_name} = _MISSING")
+        if field in lazy_fields:
+            # raw values left by lazy decoding are written as they were received, unless the variable
+            # has been set, the value is encoded in the `else` branch as usual
+            body.append(f"if {value_name} is _MISSING and _raw and {field.name!r} in _raw:")
+            body.append(f"  {value_name} = _raw[{field.name!r}]")
+            body.append(f"  if {value_name} is not None or not skip_none_field:")
+            body.append(f"    result[{key}] = _copy_raw({value_name}, copy_value)")
+            body.append("else:")
+            outer_body, body = body, []
+        body.append(f"if {value_name} is _MISSING:")
+        if field.default is not MISSING or field.default_factory is not MISSING:
+            body.append(f"  {value_name} = _var{i}.make_default()")
+            body.append(f"if {value_name} is _MISSING:")
+        if field.required:
+            body.append(f"  raise AttributeError({f'field {field.name} is required.'!r})")
+        else:
+            body.append(f"  {value_name} = None")
+
+        body.append(f"if {value_name} is None:")
+        body.append("  if not skip_none_field:")
+        body.append(f"    result[{key}] = None")
+        # pick a shortcut by the declared type, values which don't match it still go through the generic way
+        type_ = field.type_
+        if type_ in (str, int, float, bool):
+            locals[f"_type{i}"] = type_
+            body.append(f"elif type({value_name}) is _type{i}:")
+            body.append(f"  result[{key}] = {value_name}")
+        elif type_ in _IMMUTABLE_TYPES:
+            locals[f"_type{i}"] = type_
+            body.append(f"elif type({value_name}) is _type{i}:")
+            body.append(f"  result[{key}] = _encode_json_type({value_name}) if encode_json else {value_name}")
+        elif _issubclass_safe(type_, Declared):
+            body.append(f"elif isinstance({value_name}, _Declared):")
+            body.append(f"  result[{key}] = _encode_declared({value_name}, encode_json, skip_none_field, copy_value)")
+        elif _issubclass_safe(type_, GenericList):
+            locals["_GenericList"] = GenericList
+            body.append(f"elif isinstance({value_name}, _GenericList):")
+            body.append(f"  result[{key}] = _encode_list({value_name}._encodable_data(), encode_json, False, copy_value)")
+        body.append("else:")
+        body.append(f"  result[{key}] = _encode_field_value({value_name}, encode_json, skip_none_field, copy_value)")
+        if field in lazy_fields:
+            outer_body.extend(f"  {line}" for line in body)
+            body = outer_body
+    body.append("return result")
+    return _create_fn(
+        "__declared_encode__", ["obj", "encode_json", "skip_none_field", "copy_value"], body, locals=locals)
+
+
+def _encode_declared(obj, encode_json=False, skip_none_field=False, copy_value=None):
+    return _declared_encoder(obj.__class__)(obj, encode_json, skip_none_field, copy_value or _copy_shallow)
+
+
+def _encode_field_value(value, encode_json=False, skip_none_field=False, copy_value=None):
+    value = _asdict(value, encode_json=encode_json, skip_none_field=skip_none_field, copy_value=copy_value)
+    if encode_json:
+        value = _encode_json_type(value)
+    return value
 
-            field_value = obj.__dict__.get(field.name, MISSING)
-            if field_value is MISSING:
-                field_value = field.make_default()
-                if field_value is MISSING:
-                    if not field.required:
-                        field_value = None
-                    else:
-                        raise AttributeError(f"field {field.name} is required.")
 
-            if skip_none_field and field_value is None:
-                continue
+def _encode_list(items, encode_json=False, skip_none_field=False, copy_value=None):
+    """ encode a series of values, the encoder of declared items is looked up once for each run of the same class """
+    copy_value = copy_value or _copy_shallow
+    result = []
+    item_class = encoder = None
+    for item in items:
+        if item.__class__ is not item_class:
+            item_class = item.__class__
+            encoder = _declared_encoder(item_class) if _issubclass_safe(item_class, Declared) else None
+        if encoder is None:
+            result.append(_asdict(item, encode_json=encode_json, copy_value=copy_value))
+        else:
+            result.append(encoder(item, encode_json, skip_none_field, copy_value))
+    return result
+
 
-            value = _asdict(field_value, encode_json=encode_json, skip_none_field=skip_none_field)
-            result.append((field.field_name, value))
-        return _encode_overrides(dict(result), None, encode_json=encode_json)
+# values of those types are handed out by identity without copying
+_IMMUTABLE_TYPES = frozenset(
+    [str, int, float, bool, complex, type(None), Decimal, UUID, datetime, date, time, timedelta])
+
+
+def _copy_nothing(value):
+    return value
+
+
+def _copy_shallow(value):
+    return value if type(value) in _IMMUTABLE_TYPES else copy.copy(value)
+
+
+def _copy_deep(value):
+    return value if type(value) in _IMMUTABLE_TYPES else copy.deepcopy(value)
+
+
+# attributes of frozen objects caching their hash and serialized forms
+_FROZEN_CACHES = ("__declared_hash__", "__declared_cache__")
+
+
+def _frozen_setattr(self, name, value):
+    raise AttributeError(f"cannot assign to {name!r} of frozen {self.__class__.__name__!r} object")
+
+
+def _frozen_delattr(self, name):
+    raise AttributeError(f"cannot delete {name!r} of frozen {self.__class__.__name__!r} object")
+
+
+def _frozen_cache(obj: Declared) -> Dict[Any, Any]:
+    try:
+        return obj.__declared_cache__
+    except AttributeError:
+        cache = {}
+        object.__setattr__(obj, "__declared_cache__", cache)
+        return cache
+
+
+def _frozen_to_dict(self, encode_json=False, skip_none_field=False, copy="shallow"):
+    """ as same as `Declared.to_dict`, the dict is encoded once, and copied for each call """
+    copy_value = _copy_policy(copy)
+    cache = _frozen_cache(self)
+    key = ("to_dict", encode_json, skip_none_field)
+    kvs = cache.get(key)
+    if kvs is None:
+        kvs = cache[key] = Declared.to_dict(self, encode_json=encode_json, skip_none_field=skip_none_field, copy="none")
+    return _copy_tree(kvs, copy_value)
+
+
+def _frozen_to_json(self, *args, **kwargs):
+    """ as same as `Declared.to_json`, the json is encoded once for each combination of arguments """
+    cache = _frozen_cache(self)
+    key = ("to_json", args, tuple(sorted(kwargs.items())))
+    try:
+        return cache[key]
+    except KeyError:
+        result = cache[key] = Declared.to_json(self, *args, **kwargs)
+        return result
+    except TypeError:
+        # some arguments are unhashable
+        return Declared.to_json(self, *args, **kwargs)
+
+
+def _copy_tree(value, copy_value):
+    # containers built by encoding are copied, so the cached dict is never handed out, leaves are copied by the policy
+    type_ = type(value)
+    if type_ is dict:
+        return {k: v if type(v) in _IMMUTABLE_TYPES else _copy_tree(v, copy_value) for k, v in value.items()}
+    elif type_ is list:
+        return [v if type(v) in _IMMUTABLE_TYPES else _copy_tree(v, copy_value) for v in value]
+    return copy_value(value)
+
+
+def _copy_raw(value, copy_value):
+    # raw values are made of containers of json, they are copied entirely unless copy isn't wanted at all
+    return value if copy_value is _copy_nothing else copy.deepcopy(value)
+
+
+_COPY_POLICIES = {"none": _copy_nothing, "shallow": _copy_shallow, "deep": _copy_deep}
+
+
+def _copy_policy(policy: str) -> Callable[[Any], Any]:
+    try:
+        return _COPY_POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"copy must be one of {', '.join(map(repr, _COPY_POLICIES))}, but not {policy!r}") from None
+
+
+def _asdict(obj, encode_json=False, skip_none_field=False, copy_value=None):
+    copy_value = copy_value or _copy_shallow
+    if _is_declared_instance(obj):
+        return _encode_declared(obj, encode_json, skip_none_field, copy_value)
     elif isinstance(obj, Mapping):
-        return dict((_asdict(k, encode_json=encode_json), _asdict(v, encode_json=encode_json)) for k, v in obj.items())
+        return dict((_asdict(k, encode_json=encode_json, copy_value=copy_value),
+                     _asdict(v, encode_json=encode_json, copy_value=copy_value)) for k, v in obj.items())
+    elif isinstance(obj, GenericList):
+        return _encode_list(obj._encodable_data(), encode_json=encode_json, copy_value=copy_value)
     elif isinstance(obj, Collection) and not isinstance(obj, str):
-        return list(_asdict(v, encode_json=encode_json) for v in obj)
+        return _encode_list(obj, encode_json=encode_json, copy_value=copy_value)
+    else:
+        return copy_value(obj)
+
+
+# Binary format, a document is made of a header and a value
+#
+#   header: _BINARY_MAGIC, _BINARY_VERSION and 8 bytes schema fingerprint
+#   value: a tag byte and its payload, variables of declared objects are written in order of fields without names,
+#          ints and lengths are written as (zigzag) varints.
+_BINARY_MAGIC = 0xDC
+_BINARY_VERSION = 1
+(_TAG_NONE, _TAG_MISSING, _TAG_FALSE, _TAG_TRUE, _TAG_INT, _TAG_FLOAT, _TAG_STR, _TAG_BYTES, _TAG_DECIMAL, _TAG_UUID,
+ _TAG_DATETIME, _TAG_LIST, _TAG_DICT, _TAG_OBJECT) = range(14)
+_DOUBLE = struct.Struct("<d")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _schema_fingerprint(type_) -> bytes:
+    """ 8 bytes digest of names and types of variables, nested declared classes included """
+    signature = _schema_signature(type_, [])
+    return hashlib.blake2b(signature.encode("utf-8"), digest_size=8).digest()
+
+
+def _schema_signature(type_, stack: List[Type]) -> str:
+    if _issubclass_safe(type_, GenericList):
+        return f"[{_schema_signature(type_.__type__, stack)}]"
+    if not _issubclass_safe(type_, Declared):
+        return getattr(type_, "__qualname__", repr(type_))
+    if type_ in stack:
+        # a recursive class
+        return f"^{type_.__qualname__}"
+    stack.append(type_)
+    signature = ",".join(f"{field.name}:{_schema_signature(field.type_, stack)}" for field in fields(type_))
+    stack.pop()
+    return f"{{{signature}}}"
+
+
+def _binary_header(type_) -> bytes:
+    return bytes([_BINARY_MAGIC, _BINARY_VERSION]) + _compiled_function(
+        type_, "__declared_fingerprint__", _schema_fingerprint)
+
+
+def _check_binary_header(type_, data: bytes) -> int:
+    header = _binary_header(type_)
+    if data[:2] != header[:2]:
+        raise ValueError("data is not in binary format of declares, or its version is not supported")
+    if data[2:len(header)] != header[2:]:
+        raise ValueError(f"schema fingerprint of data doesn't match {type_.__name__}, it was written by another schema")
+    return len(header)
+
+
+def _write_varint(out: bytearray, n: int):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_int(out: bytearray, value: int):
+    out.append(_TAG_INT)
+    _write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+
+def _write_float(out: bytearray, value: float):
+    out.append(_TAG_FLOAT)
+    out += _DOUBLE.pack(value)
+
+
+def _write_str(out: bytearray, value: str, tag=_TAG_STR):
+    data = value.encode("utf-8")
+    out.append(tag)
+    _write_varint(out, len(data))
+    out += data
+
+
+def _write_bytes(out: bytearray, value: bytes):
+    out.append(_TAG_BYTES)
+    _write_varint(out, len(value))
+    out += value
+
+
+def _write_datetime(out: bytearray, value: datetime):
+    # microseconds of the wall time since epoch, and the utc offset in seconds if it is aware
+    delta = value.replace(tzinfo=None) - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    out.append(_TAG_DATETIME)
+    _write_varint(out, micros << 1 if micros >= 0 else ((-micros) << 1) - 1)
+    offset = value.utcoffset()
+    if offset is None:
+        out.append(0)
+    else:
+        seconds = int(offset.total_seconds())
+        out.append(1)
+        _write_varint(out, seconds << 1 if seconds >= 0 else ((-seconds) << 1) - 1)
+
+
+def _write_sequence(out: bytearray, items, write_item):
+    out.append(_TAG_LIST)
+    _write_varint(out, len(items))
+    for item in items:
+        write_item(out, item)
+
+
+def _write_any(out: bytearray, value):
+    # values which are not written by their declared types, their own types are used
+    if value is None:
+        out.append(_TAG_NONE)
+        return
+    if value is MISSING:
+        out.append(_TAG_MISSING)
+        return
+    writer = _BINARY_WRITERS.get(type(value))
+    if writer is not None:
+        writer(out, value)
+    elif _isinstance_safe(value, Declared):
+        # its class can't be known when reading, write it as a dict as same as json
+        _write_any(out, value.to_dict(copy="none"))
+    elif _isinstance_safe(value, Enum):
+        _write_any(out, value.value)
+    elif _isinstance_safe(value, Mapping):
+        out.append(_TAG_DICT)
+        _write_varint(out, len(value))
+        for k, v in value.items():
+            _write_any(out, k)
+            _write_any(out, v)
+    elif _isinstance_safe(value, GenericList):
+        _write_sequence(out, value, _write_any)
+    elif _isinstance_safe(value, Collection) and not _isinstance_safe(value, str):
+        _write_sequence(out, list(value), _write_any)
+    else:
+        for type_, writer in _BINARY_WRITERS.items():
+            if _isinstance_safe(value, type_):
+                writer(out, value)
+                return
+        raise TypeError(f"value of type {type(value).__name__} can't be written in binary format")
+
+
+_BINARY_WRITERS: Dict[type, Callable[[bytearray, Any], None]] = {
+    bool: lambda out, value: out.append(_TAG_TRUE if value else _TAG_FALSE),
+    int: _write_int,
+    float: _write_float,
+    str: _write_str,
+    bytes: _write_bytes,
+    bytearray: _write_bytes,
+    Decimal: lambda out, value: _write_str(out, str(value), _TAG_DECIMAL),
+    UUID: lambda out, value: out.extend(bytes([_TAG_UUID]) + value.bytes),
+    datetime: _write_datetime,
+}
+
+
+# types which are read back as they are written, values of other declared types are cast after reading
+_BINARY_TAGGED_TYPES = tuple(_BINARY_WRITERS) + (Mapping, Collection)
+
+
+def _write_object(type_: Type[Declared], out: bytearray, value):
+    if _isinstance_safe(value, type_):
+        out.append(_TAG_OBJECT)
+        _binary_encoder(type_)(value, out)
+    else:
+        _write_any(out, value)
+
+
+def _write_list(type_: Type[GenericList], write_item, out: bytearray, value):
+    if _isinstance_safe(value, GenericList):
+        # items of lazy list are decoded, since raw values can't be written by the declared type
+        _write_sequence(out, list(value), write_item)
     else:
-        return copy.deepcopy(obj)
+        _write_any(out, value)
+
+
+def _binary_writer(type_) -> Callable[[bytearray, Any], None]:
+    """ the function writing a value by the declared type `type_` """
+    if _issubclass_safe(type_, Declared):
+        return partial(_write_object, type_)
+    if _issubclass_safe(type_, GenericList) and type_.__type__ is not None:
+        return partial(_write_list, type_, _binary_writer(type_.__type__))
+    return _write_any
+
+
+def _read_any(buf: bytes, pos: int) -> Tuple[Any, int]:
+    tag = buf[pos]
+    if tag >= len(_BINARY_READERS):
+        raise ValueError(f"unknown tag {tag} at position {pos} of binary data")
+    return _BINARY_READERS[tag](buf, pos + 1)
+
+
+def _read_zigzag(buf: bytes, pos: int) -> Tuple[int, int]:
+    n = buf[pos]
+    if n < 0x80:
+        pos += 1
+    else:
+        n, pos = _read_varint(buf, pos)
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+
+
+def _read_str(buf: bytes, pos: int) -> Tuple[str, int]:
+    size, pos = _read_varint(buf, pos)
+    return buf[pos:pos + size].decode("utf-8"), pos + size
+
+
+def _read_bytes(buf: bytes, pos: int) -> Tuple[bytes, int]:
+    size, pos = _read_varint(buf, pos)
+    return buf[pos:pos + size], pos + size
+
+
+def _read_decimal(buf: bytes, pos: int) -> Tuple[Decimal, int]:
+    text, pos = _read_str(buf, pos)
+    return Decimal(text), pos
+
+
+def _read_datetime(buf: bytes, pos: int) -> Tuple[datetime, int]:
+    micros, pos = _read_zigzag(buf, pos)
+    value = _EPOCH + timedelta(microseconds=micros)
+    aware = buf[pos]
+    pos += 1
+    if aware:
+        seconds, pos = _read_zigzag(buf, pos)
+        value = value.replace(tzinfo=timezone(timedelta(seconds=seconds)))
+    return value, pos
+
+
+def _read_sequence(buf: bytes, pos: int) -> Tuple[List[Any], int]:
+    size, pos = _read_varint(buf, pos)
+    items = []
+    for _ in range(size):
+        item, pos = _read_any(buf, pos)
+        items.append(item)
+    return items, pos
+
+
+def _read_mapping(buf: bytes, pos: int) -> Tuple[Dict[Any, Any], int]:
+    size, pos = _read_varint(buf, pos)
+    result = {}
+    for _ in range(size):
+        k, pos = _read_any(buf, pos)
+        result[k], pos = _read_any(buf, pos)
+    return result, pos
+
+
+def _read_unexpected_object(buf: bytes, pos: int):
+    # objects are only written where their declared classes are known
+    raise ValueError(f"unexpected object at position {pos - 1} of binary data")
+
+
+# indexed by tags
+_BINARY_READERS: List[Callable[[bytes, int], Tuple[Any, int]]] = [
+    lambda buf, pos: (None, pos),
+    lambda buf, pos: (MISSING, pos),
+    lambda buf, pos: (False, pos),
+    lambda buf, pos: (True, pos),
+    _read_zigzag,
+    lambda buf, pos: (_DOUBLE.unpack_from(buf, pos)[0], pos + 8),
+    _read_str,
+    _read_bytes,
+    _read_decimal,
+    lambda buf, pos: (UUID(bytes=buf[pos:pos + 16]), pos + 16),
+    _read_datetime,
+    _read_sequence,
+    _read_mapping,
+    _read_unexpected_object,
+]
+
+
+def _read_object(type_: Type[Declared], validate: bool, buf: bytes, pos: int) -> Tuple[Any, int]:
+    if buf[pos] == _TAG_OBJECT:
+        return _binary_decoder(type_, validate)(buf, pos + 1)
+    return _read_any(buf, pos)
+
+
+def _read_list(type_: Type[GenericList], read_item, buf: bytes, pos: int) -> Tuple[Any, int]:
+    if buf[pos] != _TAG_LIST or read_item is _read_any:
+        items, pos = _read_any(buf, pos)
+        return (type_(items) if _isinstance_safe(items, list) else items), pos
+    size, pos = _read_varint(buf, pos + 1)
+    items = []
+    for _ in range(size):
+        item, pos = read_item(buf, pos)
+        items.append(item)
+    return type_(items), pos
+
+
+def _read_cast(type_: type, buf: bytes, pos: int) -> Tuple[Any, int]:
+    # values such as Enum are written in their own types, they are cast back to the declared type
+    value, pos = _read_any(buf, pos)
+    if value is not None and value is not MISSING and not isinstance(value, type_):
+        value = type_(value)
+    return value, pos
+
+
+def _binary_reader(type_, validate: bool = True) -> Callable[[bytes, int], Tuple[Any, int]]:
+    """ the function reading a value written by `_binary_writer(type_)` """
+    if _issubclass_safe(type_, Declared):
+        return partial(_read_object, type_, validate if validate is False else type_.meta["validate"])
+    if _issubclass_safe(type_, GenericList) and type_.__type__ is not None:
+        return partial(_read_list, type_, _binary_reader(type_.__type__, validate))
+    if _isinstance_safe(type_, type) and not _issubclass_safe(type_, _BINARY_TAGGED_TYPES):
+        return partial(_read_cast, type_)
+    return _read_any
+
+
+def _binary_encoder(cls: Type[Declared]) -> Callable[[Declared, bytearray], None]:
+    """ Return the binary encoder compiled for `cls`, build it at first use. """
+    return _compiled_function(cls, "__declared_binary_encoder__", _build_binary_encoder)
+
+
+def _binary_decoder(cls: Type[Declared], validate: bool = True) -> Callable[[bytes, int], Tuple[Declared, int]]:
+    """ Return the binary decoder compiled for `cls`, build it at first use. """
+    if validate:
+        return _compiled_function(cls, "__declared_binary_decoder__", _build_binary_decoder)
+    return _compiled_function(cls, "__declared_unchecked_binary_decoder__",
+                              partial(_build_binary_decoder, validate=False))
+
+
+def _build_binary_encoder(cls: Type[Declared]) -> Callable[[Declared, bytearray], None]:
+    # The generated function writes variables in order of fields, for example
+    #
+    #   def __declared_binary_encode__(obj, out):
+    #       _get = obj.__dict__.get
+    #       _write0(out, _get('a', _MISSING))  # or `_slot0.__get__(obj)` for variables in slots
+    #       ......
+    #
+    # variables which are not set are written as MISSING, and raw values of lazy decoding are decoded first.
+    fs = fields(cls)
+    locals = {"_MISSING": MISSING}
+    body = []
+    if any(_slot_of(cls, field.name) is None for field in fs):
+        body.append("_get = obj.__dict__.get")
+    if _lazy_fields(cls):
+        body.append("_raw = _get('__declared_raw__')")
+        body.append("if _raw:")
+        body.append("  for _name in list(_raw):")
+        body.append("    getattr(obj, _name)")
+    for i, field in enumerate(fs):
+        locals[f"_write{i}"] = _binary_writer(field.type_)
+        slot = _slot_of(cls, field.name)
+        if slot is None:
+            body.append(f"_write{i}(out, _get({field.name!r}, _MISSING))")
+        else:
+            locals[f"_slot{i}"] = slot
+            body.append("try:")
+            body.append(f"  _write{i}(out, _slot{i}.__get__(obj))")
+            body.append("except AttributeError:")
+            body.append("  out.append(_TAG_MISSING)")
+            locals["_TAG_MISSING"] = _TAG_MISSING
+    if not body:
+        body.append("pass")
+    return _create_fn("__declared_binary_encode__", ["obj", "out"], body, locals=locals)
+
+
+def _build_binary_decoder(cls: Type[Declared], validate: bool = True) -> Callable[[bytes, int], Tuple[Declared, int]]:
+    # The generated function reads variables in order of fields, for example
+    #
+    #   def __declared_binary_decode__(buf, pos):
+    #       _v0, pos = _read0(buf, pos)
+    #       ......
+    #       return _cls(a=_v0, ......), pos
+    #
+    # values are read in their own types, so they are not cast again, without validation the object is built
+    # by `_construct` instead of `_cls`.
+    locals = {"_cls": cls, "_construct": _declared_constructor(cls)}
+    body = []
+    init_args = []
+    for i, field in enumerate(fields(cls)):
+        locals[f"_read{i}"] = _binary_reader(field.type_, validate)
+        body.append(f"_v{i}, pos = _read{i}(buf, pos)")
+        init_args.append(f"{field.name}=_v{i}")
+    body.append(f"return {'_cls' if validate else '_construct'}({', '.join(init_args)}), pos")
+    return _create_fn("__declared_binary_decode__", ["buf", "pos"], body, locals=locals)
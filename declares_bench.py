@@ -0,0 +1,321 @@
+"""
+benchmarks of declares, cases are compared against stdlib dataclasses + json doing the same work
+
+>>> python declares_bench.py
+>>> python declares_bench.py --quick --filter flat/
+>>> python declares_bench.py --json before.json
+>>> python declares_bench.py --compare before.json              # run and compare against before.json
+>>> python declares_bench.py --compare before.json after.json   # compare two saved results
+
+results are seconds per operation, the best of `--repeat` rounds. `--compare` reports cases which became slower
+than `--threshold` and exits with status 1 if there are any.
+"""
+import argparse
+import dataclasses
+import json
+import pickle
+import platform
+import sys
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from uuid import UUID, uuid4
+
+from declares import Declared, new_list_type, var
+
+LIST_SIZES = (1, 100, 10000, 1000000)
+QUICK_LIST_SIZES = (1, 100, 10000)
+NESTED_DEPTH = 8
+WIDE_COLUMNS = 40
+
+Case = Tuple[str, Callable[[], object]]
+
+
+class _Point(object):
+    """ a mutable leaf value, to_dict has to copy it unless asked not to """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+_WIDE_TYPES = (str, int, Decimal, datetime, _Point)
+
+
+def _make_wide_record(columns=WIDE_COLUMNS):
+    """ a record of many scalar columns, cycling through immutable and mutable leaf types """
+    samples = {str: "value", int: 42, Decimal: Decimal("1.5"), datetime: datetime(2020, 1, 1), _Point: _Point(1, 2)}
+    namespace = {}
+    values = {}
+    for i in range(columns):
+        type_ = _WIDE_TYPES[i % len(_WIDE_TYPES)]
+        namespace[f"col{i}"] = var(type_, auto_cast=False)
+        values[f"col{i}"] = samples[type_]
+    namespace["id"] = var(UUID, auto_cast=False)
+    values["id"] = uuid4()
+    return type("Wide", (Declared,), namespace)(**values)
+
+
+class _Flat(Declared):
+    """ a record of a few scalar variables """
+    id = var(int)
+    name = var(str)
+    score = var(float)
+    count = var(int)
+    note = var(str)
+
+
+@dataclasses.dataclass
+class _FlatData:
+    id: int
+    name: str
+    score: float
+    count: int
+    note: str
+
+
+_FLAT_VALUES = {"id": 1, "name": "name", "score": 1.5, "count": 3, "note": "note"}
+
+
+class _Row(Declared):
+    """ a record pickled by fields """
+    id = var(int)
+    name = var(str)
+    score = var(float)
+    note = var(str, required=False)
+    tags = var(list, default_factory=list)
+
+
+class _DefaultRow(_Row):
+    """ the same record pickled by `__dict__`, as objects were pickled before """
+    __reduce__ = object.__reduce__
+
+
+_SCALAR_TYPES = (str, int, float)
+_SCALAR_SAMPLES = {str: "value", int: 42, float: 1.5}
+
+
+def _wide_classes(columns=WIDE_COLUMNS):
+    """ a declared class and a dataclass of many scalar columns, and values of a record """
+    names = [f"col{i}" for i in range(columns)]
+    types = [_SCALAR_TYPES[i % len(_SCALAR_TYPES)] for i in range(columns)]
+    declared = type("Wide", (Declared,), {name: var(type_) for name, type_ in zip(names, types)})
+    data = dataclasses.make_dataclass("WideData", list(zip(names, types)))
+    return declared, data, {name: _SCALAR_SAMPLES[type_] for name, type_ in zip(names, types)}
+
+
+def _nested_classes(depth=NESTED_DEPTH):
+    """ declared classes and dataclasses nested `depth` levels through their `child` variables, and values of
+    the outermost record
+    """
+    declared = type("Child", (Declared,), {"__xml_tag_name__": "child", "value": var(int), "name": var(str)})
+    data = dataclasses.make_dataclass("ChildData", [("value", int), ("name", str)])
+    values = {"value": depth, "name": "level"}
+    for level in range(depth - 1, 0, -1):
+        declared = type("Child", (Declared,), {
+            "__xml_tag_name__": "child", "value": var(int), "name": var(str), "child": var(declared)})
+        data = dataclasses.make_dataclass("ChildData", [("value", int), ("name", str), ("child", data)])
+        values = {"value": level, "name": "level", "child": values}
+    return declared, data, values
+
+
+def _dataclass_from_dict(cls, kvs):
+    """ what a user of dataclasses writes to decode nested dicts """
+    kwargs = {}
+    for field in dataclasses.fields(cls):
+        value = kvs[field.name]
+        kwargs[field.name] = _dataclass_from_dict(field.type, value) if dataclasses.is_dataclass(field.type) else value
+    return cls(**kwargs)
+
+
+def _record_cases(shape: str, declared, data, values) -> Iterator[Case]:
+    """ codecs of a single record, by declares and by dataclasses + json """
+    obj = declared.from_dict(values)
+    dumped = obj.to_json()
+    element = obj.to_xml()
+    record = _dataclass_from_dict(data, values)
+    if shape == "flat":
+        yield f"{shape}/construct/declares", lambda: declared(**values)
+        yield f"{shape}/construct/dataclasses", lambda: data(**values)
+    yield f"{shape}/from_dict/declares", lambda: declared.from_dict(values)
+    yield f"{shape}/to_dict/declares", obj.to_dict
+    yield f"{shape}/to_json/declares", obj.to_json
+    yield f"{shape}/from_json/declares", lambda: declared.from_json(dumped)
+    yield f"{shape}/to_xml/declares", obj.to_xml
+    yield f"{shape}/from_xml/declares", lambda: declared.from_xml(element)
+
+    yield f"{shape}/from_dict/dataclasses", lambda: _dataclass_from_dict(data, values)
+    yield f"{shape}/to_dict/dataclasses", lambda: dataclasses.asdict(record)
+    yield f"{shape}/to_json/dataclasses", lambda: json.dumps(dataclasses.asdict(record))
+    yield f"{shape}/from_json/dataclasses", lambda: _dataclass_from_dict(data, json.loads(dumped))
+
+
+def bench_records() -> Iterator[Case]:
+    """ flat, wide and nested records """
+    yield from _record_cases("flat", _Flat, _FlatData, _FLAT_VALUES)
+    yield from _record_cases("wide", *_wide_classes())
+    yield from _record_cases("nested", *_nested_classes())
+
+
+def bench_query_string() -> Iterator[Case]:
+    """ query string and form data of a flat record, which can't have nested objects """
+    obj = _Flat(**_FLAT_VALUES)
+    query_string = obj.to_query_string()
+    form_data = obj.to_form_data()
+    yield "flat/to_query_string/declares", obj.to_query_string
+    yield "flat/from_query_string/declares", lambda: _Flat.from_query_string(query_string)
+    yield "flat/to_form_data/declares", obj.to_form_data
+    yield "flat/from_form_data/declares", lambda: _Flat.from_form_data(form_data)
+
+
+def bench_lists(sizes=LIST_SIZES) -> Iterator[Case]:
+    """ json of lists of flat records """
+    Flats = new_list_type(_Flat)
+    for size in sizes:
+        items = Flats([_Flat(**_FLAT_VALUES) for _ in range(size)])
+        records = [_FlatData(**_FLAT_VALUES) for _ in range(size)]
+        dumped = items.to_json()
+        yield f"list[{size}]/to_json/declares", items.to_json
+        yield f"list[{size}]/from_json/declares", lambda dumped=dumped: Flats.from_json(dumped)
+        yield f"list[{size}]/to_json/dataclasses", lambda records=records: json.dumps(
+            [dataclasses.asdict(record) for record in records])
+        yield f"list[{size}]/from_json/dataclasses", lambda dumped=dumped: [
+            _FlatData(**kvs) for kvs in json.loads(dumped)]
+
+
+def bench_to_dict_copy() -> Iterator[Case]:
+    """ to_dict of a wide record with mutable leaves under each copy policy """
+    record = _make_wide_record()
+    for policy in ("none", "shallow", "deep"):
+        yield f"wide/to_dict copy={policy}/declares", lambda policy=policy: record.to_dict(copy=policy)
+
+
+def bench_frozen() -> Iterator[Case]:
+    """ hash and codecs of a nested record, computed for each call against cached by a frozen class """
+    declared, _, values = _nested_classes()
+    frozen = type("Frozen", (declared,), {}, frozen=True)
+    for name, cls in (("mutable", declared), ("frozen", frozen)):
+        obj = cls.from_dict(values)
+        yield f"nested/hash {name}/declares", lambda obj=obj: hash(obj)
+        yield f"nested/to_dict {name}/declares", obj.to_dict
+        yield f"nested/to_json {name}/declares", obj.to_json
+
+
+def bench_replace() -> Iterator[Case]:
+    """ a copy of a nested record with one variable changed, by replace against by a round trip of to_dict """
+    declared, _, values = _nested_classes()
+    obj = declared.from_dict(values)
+
+    def round_trip():
+        kvs = obj.to_dict(copy="none")
+        kvs["name"] = "changed"
+        return declared.from_dict(kvs)
+
+    yield "nested/replace/declares", lambda: obj.replace(name="changed")
+    yield "nested/replace by to_dict/declares", round_trip
+
+
+def bench_pickle(rows=10000) -> Iterator[Case]:
+    """ pickle round trips of a list of records, by fields against by `__dict__` """
+    for name, cls in (("fields", _Row), ("__dict__", _DefaultRow)):
+        records = [cls(id=i, name=f"name{i}", score=i / 2, tags=["a"]) for i in range(rows)]
+        data = pickle.dumps(records, pickle.HIGHEST_PROTOCOL)
+        yield f"list[{rows}]/pickle.dumps by {name}/declares", (
+            lambda records=records: pickle.dumps(records, pickle.HIGHEST_PROTOCOL))
+        yield f"list[{rows}]/pickle.loads by {name}/declares", lambda data=data: pickle.loads(data)
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> float:
+    """ seconds per call of `func`, the best of `repeat` rounds which take 0.2 seconds at least """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(quick: bool = False, pattern: Optional[str] = None, repeat: int = 3) -> Dict[str, float]:
+    benches = (bench_records(), bench_query_string(), bench_lists(QUICK_LIST_SIZES if quick else LIST_SIZES),
+               bench_to_dict_copy(), bench_frozen(), bench_replace(),
+               bench_pickle())
+    results = {}
+    for bench in benches:
+        for name, func in bench:
+            if pattern is None or pattern in name:
+                results[name] = measure(func, repeat)
+                print(f"{name:<50} {_format_seconds(results[name]):>10}", file=sys.stderr)
+    return results
+
+
+def report(results: Dict[str, float]):
+    """ print declares cases with their times relative to dataclasses + json doing the same work """
+    print(f"{'case':<50} {'declares':>10} {'baseline':>10} {'ratio':>8}")
+    for name, seconds in results.items():
+        case, _, library = name.rpartition("/")
+        if library != "declares":
+            continue
+        baseline = results.get(f"{case}/dataclasses")
+        if baseline is None:
+            print(f"{case:<50} {_format_seconds(seconds):>10}")
+        else:
+            print(f"{case:<50} {_format_seconds(seconds):>10} {_format_seconds(baseline):>10} "
+                  f"{seconds / baseline:>7.2f}x")
+
+
+def compare(base: Dict[str, float], current: Dict[str, float], threshold: float = 0.1) -> int:
+    """ print cases in both results, return the number of cases slower than `threshold` """
+    regressions = 0
+    print(f"{'case':<50} {'base':>10} {'current':>10} {'change':>8}")
+    for name, seconds in current.items():
+        if name not in base:
+            continue
+        change = seconds / base[name] - 1
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<50} {_format_seconds(base[name]):>10} {_format_seconds(seconds):>10} {change:>+8.1%}{flag}")
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return regressions
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def _load(path: str) -> Dict[str, float]:
+    with open(path) as fp:
+        return json.load(fp)["results"]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmarks of declares")
+    parser.add_argument("--json", metavar="PATH", help="write results to PATH as json")
+    parser.add_argument("--compare", nargs="+", metavar="PATH",
+                        help="compare results against a base file, and against a second file instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as regression, 0.1 by default")
+    parser.add_argument("--filter", metavar="TEXT", help="run cases whose names contain TEXT only")
+    parser.add_argument("--quick", action="store_true", help="lists up to 10000 items instead of 1000000")
+    parser.add_argument("--repeat", type=int, default=3, help="rounds of each case, the best one is taken")
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes one or two files")
+    if args.compare and len(args.compare) == 2:
+        results = _load(args.compare[1])
+    else:
+        results = run(args.quick, args.filter, args.repeat)
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({"python": sys.version, "platform": platform.platform(), "results": results}, fp, indent=2)
+    if args.compare:
+        return 1 if compare(_load(args.compare[0]), results, args.threshold) else 0
+    report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
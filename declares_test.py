@@ -1,7 +1,16 @@
+import asyncio
+import io
+import json
+import pickle
 import unittest
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+from xml.etree import ElementTree as ET
 
-from declares import var, Declared, NamingStyle, new_list_type, pascalcase_var
+from declares import ET_escape_cdata, MISSING, disable_profiling, enable_profiling, profiling_snapshot, var, Declared, NamingStyle, new_lazy_list_type, new_list_type, pascalcase_var, Var
 
 
 class QueryStringTestCase(unittest.TestCase):
@@ -969,5 +978,1428 @@ class SimpleDeclaredTestCase(unittest.TestCase):
         self.assertEqual(json_obj_1, json_obj_2)
 
 
+class CompiledDecoderTestCase(unittest.TestCase):
+
+    def test_defaults_and_casts(self):
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(int, default=10)
+            c = var(str, default_factory=lambda: "c")
+            d = var(Decimal)
+            e = var(UUID)
+            f = var(int, required=False)
+            g = var(str, auto_cast=False)
+
+        inst = Klass.from_dict({"a": "1", "d": "1.5", "e": "12345678123456781234567812345678", "g": 1})
+        self.assertEqual(inst.a, 1)
+        self.assertEqual(inst.b, 10)
+        self.assertEqual(inst.c, "c")
+        self.assertEqual(inst.d, Decimal("1.5"))
+        self.assertEqual(inst.e, UUID("12345678123456781234567812345678"))
+        self.assertEqual(inst.g, 1)
+        self.assertEqual(inst.to_dict()["f"], None)
+        self.assertRaises(ValueError, Klass.from_dict, {"a": "one"})
+
+    def test_nested_and_forward_reference(self):
+        inst = CombineJSONTestClass.from_dict(
+            {"a": "1", "b": "123", "json": {"a": 1, "b": 1, "c": b"", "d": "", "e": 0, "f": [], "g": {}}})
+        self.assertEqual(inst.a, 1)
+        self.assertEqual(inst.json.b, 1.0)
+        self.assertIs(type(inst.json), JSONTestClass)
+        self.assertIs(CombineJSONTestClass.from_dict(inst), inst)
+
+    def test_from_json(self):
+        inst = InnerJSONTestClass.from_json('{"ia": 1, "ib": "2"}')
+        self.assertEqual((inst.ia, inst.ib), (1, 2))
+
+    def test_decoder_per_class(self):
+
+        class Base(Declared):
+            a = var(int)
+
+        class Child(Base):
+            b = var(int)
+
+        self.assertEqual(Base.from_dict({"a": 1, "b": 2}).to_dict(), {"a": 1})
+        self.assertEqual(Child.from_dict({"a": 1, "b": 2}).to_dict(), {"a": 1, "b": 2})
+        self.assertIs(type(Child.from_dict({"a": 1, "b": 2})), Child)
+
+
+class CompiledEncoderTestCase(unittest.TestCase):
+
+    def test_to_dict(self):
+
+        class Inner(Declared):
+            a = var(int)
+            b = var(str, required=False)
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(Decimal)
+            c = var(Inner)
+            d = var(new_list_type(Inner))
+            e = var(str, default="e")
+            f = var(int, ignore_serialize=True)
+            g = var(datetime)
+
+        dt = datetime(2019, 8, 2, tzinfo=timezone.utc)
+        inst = Klass(1, Decimal("1.5"), Inner(1), new_list_type(Inner)([Inner(2, "b")]), f=1, g=dt)
+        self.assertEqual(inst.to_dict(), {
+            "a": 1,
+            "b": Decimal("1.5"),
+            "c": {"a": 1, "b": None},
+            "d": [{"a": 2, "b": "b"}],
+            "e": "e",
+            "g": dt,
+        })
+        self.assertEqual(inst.to_dict(encode_json=True, skip_none_field=True), {
+            "a": 1,
+            "b": "1.5",
+            "c": {"a": 1},
+            "d": [{"a": 2, "b": "b"}],
+            "e": "e",
+            "g": dt.timestamp(),
+        })
+
+    def test_value_not_match_declared_type(self):
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(str)
+
+        inst = Klass(1.5, [1, 2])
+        self.assertEqual(inst.to_dict(), {"a": 1.5, "b": [1, 2]})
+
+    def test_generic_list_to_json(self):
+        strings = new_list_type(str)
+        self.assertEqual(strings(["1", "2"]).to_json(), '["1", "2"]')
+
+
+class GeneratedMethodsTestCase(unittest.TestCase):
+
+    def test_init(self):
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(int, default=2)
+            c = var(int, required=False)
+
+        inst = Klass(1, d=4)
+        self.assertEqual((inst.a, inst.b, inst.to_dict()["c"]), (1, 2, None))
+        self.assertEqual(Klass(b=3, a=1).b, 3)
+        self.assertRaises(AttributeError, Klass, b=3)
+
+    def test_user_defined_methods(self):
+
+        class Base(Declared):
+            a = var(int)
+
+            def __init__(self, value):
+                super().__init__(a=value * 2)
+
+            def __str__(self):
+                return "base"
+
+        class Child(Base):
+            b = var(int, default=1)
+
+        self.assertEqual(Base(1).a, 2)
+        self.assertEqual(str(Base(1)), "base")
+        self.assertEqual(Child(1).a, 2)
+        self.assertEqual(str(Child(1)), "base")
+        self.assertEqual(repr(Child(1)), "Child(a=2,b=1)")
+
+    def test_user_defined_init_of_subclass(self):
+
+        class Base(Declared):
+            x = var(int)
+
+        class Child(Base):
+            y = var(int)
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+
+        self.assertEqual(Child(x=1, y=2).to_dict(), {"x": 1, "y": 2})
+        self.assertEqual(Child(1, 2).to_dict(), {"x": 1, "y": 2})
+        with self.assertRaises(AttributeError):
+            Child(x=1)
+        self.assertEqual(Base(x=1).x, 1)
+
+    def test_eq_and_hash_per_class(self):
+
+        class Base(Declared):
+            a = var(int)
+
+        class Child(Base):
+            b = var(list)
+
+        self.assertEqual(Child(1, [1]), Child(1, [1]))
+        self.assertNotEqual(Child(1, [1]), Child(1, [2]))
+        self.assertNotEqual(Base(1), Child(1, [1]))
+        self.assertEqual(hash(Child(1, [1])), hash(Child(1, [1])))
+        self.assertEqual(hash(Base(1)), hash(Base(1)))
+        self.assertEqual(len({Base(1), Base(1), Base(2)}), 2)
+
+    def test_shared_base_fields(self):
+
+        class Base(Declared):
+            a = var(int)
+
+        class Left(Base):
+            b = var(int)
+
+        class Right(Base):
+            c = var(int)
+
+        class Both(Left, Right):
+            d = var(int)
+
+        self.assertEqual(Both.fields, ("a", "b", "c", "d"))
+        self.assertEqual(Both(1, 2, 3, 4).to_dict(), {"a": 1, "b": 2, "c": 3, "d": 4})
+
+
+class SlotsDeclaredTestCase(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+
+        class Klass(Declared, slots=True):
+            a = var(int)
+            b = var(int, default=2)
+            c = var(int, required=False)
+
+        inst = Klass(1)
+        self.assertFalse(hasattr(inst, "__dict__"))
+        self.assertEqual(Klass.__slots__, ("a", "b", "c"))
+        self.assertEqual((inst.a, inst.b), (1, 2))
+        self.assertRaises(AttributeError, setattr, inst, "d", 1)
+        self.assertRaises(TypeError, setattr, inst, "a", "1")
+        self.assertEqual(inst.to_dict(), {"a": 1, "b": 2, "c": None})
+        self.assertEqual(Klass.from_dict({"a": "1", "c": 3}), Klass(1, c=3))
+
+    def test_lazy_default(self):
+
+        class Klass(Declared, slots=True):
+            a = var(int, init=False, default=1)
+            b = var(int, init=False)
+
+        inst = Klass()
+        self.assertEqual(inst.a, 1)
+        self.assertEqual(inst.b, None)
+        self.assertRaises(AttributeError, inst.to_dict)
+        inst.b = 2
+        self.assertEqual(inst.to_dict(), {"a": 1, "b": 2})
+
+    def test_inherit(self):
+
+        class Base(Declared, slots=True):
+            a = var(int)
+
+        class Child(Base, slots=True):
+            b = var(int)
+
+        class DictChild(Base):
+            c = var(int)
+
+        self.assertEqual(Child.__slots__, ("b",))
+        self.assertFalse(hasattr(Child(1, 2), "__dict__"))
+        self.assertEqual(Child(1, 2).to_dict(), {"a": 1, "b": 2})
+        self.assertEqual(DictChild(1, 2).to_dict(), {"a": 1, "c": 2})
+        self.assertEqual(DictChild(1, 2).__dict__, {"c": 2})
+
+    def test_codecs(self):
+
+        class Item(Declared, slots=True):
+            name = var(str, as_xml_attr=True)
+            text = var(str, as_xml_text=True)
+
+        class Style(Declared, slots=True):
+            name = var(str, as_xml_attr=True)
+            items = var(new_list_type(Item), field_name="item")
+
+        style = Style.from_xml_string('<style name="s"><item name="a">1</item><item name="b">2</item></style>')
+        self.assertEqual(style.to_xml_bytes().decode(),
+                         '<style name="s"><item name="a">1</item><item name="b">2</item></style>')
+        self.assertEqual(style.to_json(), '{"name": "s", "item": [{"name": "a", "text": "1"}, {"name": "b", "text": "2"}]}')
+
+        class Query(Declared, slots=True):
+            a = var(int)
+            b = var(str)
+
+        self.assertEqual(Query.from_query_string("a=1&b=x").to_query_string(), "a=1&b=x")
+        self.assertEqual(Query.from_form_data("a=1&b=x").to_form_data(), "a=1&b=x")
+
+
+class VarDescriptorTestCase(unittest.TestCase):
+
+    def test_class_attribute(self):
+
+        class Klass(Declared):
+            a = var(int)
+
+        self.assertIsInstance(Klass.a, Var)
+        self.assertIs(Klass.a, Klass.meta["vars"]["a"])
+
+    def test_lazy_default(self):
+
+        class Klass(Declared):
+            a = var(int, init=False, default_factory=lambda: 1)
+            b = var(int, init=False)
+
+        inst = Klass()
+        self.assertNotIn("a", inst.__dict__)
+        self.assertEqual(inst.a, 1)
+        self.assertEqual(inst.__dict__["a"], 1)
+        self.assertEqual(inst.b, None)
+        self.assertNotIn("b", inst.__dict__)
+        self.assertRaises(AttributeError, getattr, inst, "c")
+
+    def test_set(self):
+
+        class Klass(Declared):
+            a = var(int)
+
+        inst = Klass(1)
+        inst.a = 2
+        self.assertEqual(inst.a, 2)
+        self.assertRaises(TypeError, setattr, inst, "a", "2")
+        inst.other = "other"
+        self.assertEqual(inst.other, "other")
+
+    def test_mixin_vars(self):
+
+        class Mixin:
+            m = var(int, default=1)
+
+        class Klass(Declared, Mixin):
+            a = var(int)
+
+        class Child(Klass):
+            b = var(int)
+
+        self.assertEqual(Klass.fields, ("m", "a"))
+        self.assertEqual(Child.fields, ("m", "a", "b"))
+        self.assertEqual(Child(a=2, b=3).to_dict(), {"m": 1, "a": 2, "b": 3})
+
+
+class StreamingXmlDecodeTestCase(unittest.TestCase):
+
+    def test_iter_xml(self):
+
+        class Neighbor(Declared):
+            name = var(str, as_xml_attr=True)
+
+        class Country(Declared):
+            name = var(str, as_xml_attr=True)
+            rank = var(int)
+            neighbor = var(Neighbor)
+
+        xml_bytes = b"""<?xml version="1.0" encoding="utf-8"?>
+        <data>
+            <meta><count>2</count></meta>
+            <countries>
+                <country name="Liechtenstein"><rank>1</rank><neighbor name="Austria"/></country>
+                <country name="Singapore"><rank>4</rank><neighbor name="Malaysia"/></country>
+            </countries>
+        </data>
+        """
+        countries = list(new_list_type(Country).iter_xml(io.BytesIO(xml_bytes)))
+        self.assertEqual([c.name for c in countries], ["Liechtenstein", "Singapore"])
+        self.assertEqual([c.rank for c in countries], [1, 4])
+        self.assertEqual(countries[1].neighbor.name, "Malaysia")
+
+        neighbors = list(new_list_type(Neighbor).iter_xml(io.BytesIO(xml_bytes), "neighbor"))
+        self.assertEqual([n.name for n in neighbors], ["Austria", "Malaysia"])
+
+    def test_iter_xml_nested_item_tag(self):
+
+        class Leaf(Declared):
+            name = var(str, as_xml_attr=True)
+
+        class Node(Declared):
+            name = var(str, as_xml_attr=True)
+            children = var(new_list_type(Leaf), field_name="node")
+
+        xml_bytes = b'<tree><node name="a"><node name="b"/></node><node name="c"/></tree>'
+        nodes = list(new_list_type(Node).iter_xml(io.BytesIO(xml_bytes)))
+        self.assertEqual([n.name for n in nodes], ["a", "c"])
+        self.assertEqual([n.name for n in nodes[0].children], ["b"])
+
+
+class JsonLinesTestCase(unittest.TestCase):
+
+    def test_iter_jsonl(self):
+        text = '{"ia": 1, "ib": 2}\n\n{"ia": "3", "ib": 4}\n'
+        records = list(InnerJSONTestClass.iter_jsonl(io.StringIO(text)))
+        self.assertEqual(records, [InnerJSONTestClass(1, 2), InnerJSONTestClass(3, 4)])
+
+        chunks = [b'{"ia": 1, "i', b'b": 2}\n{"ia": 3,', b' "ib": 4}']
+        records = list(InnerJSONTestClass.iter_jsonl(iter(chunks)))
+        self.assertEqual(records, [InnerJSONTestClass(1, 2), InnerJSONTestClass(3, 4)])
+
+    def test_iter_jsonl_without_validation(self):
+        class Trusted(Declared, validate=False):
+            x = var(int)
+
+            def __post_init__(self, **omits):
+                raise ValueError("initialized")
+
+        self.assertEqual([record.x for record in Trusted.iter_jsonl(['{"x": 1}\n'])], [1])
+
+    def test_to_jsonl(self):
+        items = new_list_type(InnerJSONTestClass)([InnerJSONTestClass(1, 2), InnerJSONTestClass(3, None)])
+
+        fp = io.StringIO()
+        items.to_jsonl(fp, skip_none_field=True)
+        self.assertEqual(fp.getvalue(), '{"ia": 1, "ib": 2}\n{"ia": 3}\n')
+
+        fp = io.BytesIO()
+        items.to_jsonl(fp)
+        self.assertEqual(fp.getvalue(), b'{"ia": 1, "ib": 2}\n{"ia": 3, "ib": null}\n')
+        fp.seek(0)
+        self.assertEqual(next(InnerJSONTestClass.iter_jsonl(fp)), items[0])
+
+
+class BulkDecodeTestCase(unittest.TestCase):
+
+    def test_from_dicts(self):
+
+        class Inner(Declared):
+            x = var(int)
+
+        class Row(Declared):
+            a = var(int)
+            b = var(str, default="b")
+            c = var(datetime, required=False)
+            d = var(Inner)
+            e = var(new_list_type(Inner), required=False)
+
+        tz = datetime.now(timezone.utc).astimezone().tzinfo
+        rows = [
+            {"a": 1, "c": 1564758694.0, "d": {"x": 1}, "e": [{"x": 2}]},
+            {"a": "2", "b": "x", "d": {"x": "3"}},
+        ]
+        result = new_list_type(Row).from_dicts(rows)
+        self.assertEqual(list(result), [Row.from_dict(row) for row in rows])
+        self.assertEqual(result[0].c, datetime.fromtimestamp(1564758694.0, tz=tz))
+        self.assertEqual(result[0].e, new_list_type(Inner)([Inner(2)]))
+        self.assertEqual((result[1].a, result[1].b, result[1].d.x), (2, "x", 3))
+        self.assertRaises(ValueError, new_list_type(Row).from_dicts, [{"a": "one", "d": {"x": 1}}])
+
+    def test_mixed_rows(self):
+        instance = InnerJSONTestClass(5, 6)
+        result = new_list_type(InnerJSONTestClass).from_dicts([{"ia": 1, "ib": 2}, instance, {}])
+        self.assertEqual(result[0], InnerJSONTestClass(1, 2))
+        self.assertIs(result[1], instance)
+        self.assertIs(type(result[2]), InnerJSONTestClass)
+
+    def test_custom_init(self):
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(int)
+
+            def __init__(self, b, a):
+                super().__init__(a=a, b=b)
+
+        result = new_list_type(Klass).from_dicts([{"a": 1, "b": 2}])
+        self.assertEqual((result[0].a, result[0].b), (1, 2))
+
+    def test_from_json(self):
+        result = new_list_type(InnerJSONTestClass).from_json('[{"ia": 1, "ib": 2}, {"ia": 3, "ib": "4"}]')
+        self.assertEqual(list(result), [InnerJSONTestClass(1, 2), InnerJSONTestClass(3, 4)])
+        self.assertEqual(list(new_list_type(str).from_json('["1", "2"]')), ["1", "2"])
+        self.assertRaises(TypeError, new_list_type(str).from_dicts, [{"a": 1}])
+
+
+class UncheckedConstructTestCase(unittest.TestCase):
+
+    def test_construct(self):
+
+        class Klass(Declared):
+            a = var(int)
+            b = var(int, default="not checked")
+            c = var(int, init=False)
+
+            def __post_init__(self):
+                raise AssertionError("not called")
+
+        inst = Klass.construct(a="1", c=3, d=4)
+        self.assertEqual((inst.a, inst.b, inst.c), ("1", "not checked", 3))
+        self.assertFalse(hasattr(inst, "d"))
+        self.assertIsNone(Klass.construct().a)
+        self.assertRaises(TypeError, setattr, inst, "a", "1")
+
+    def test_from_dict_without_validation(self):
+
+        class Inner(Declared):
+            x = var(int, default="x", auto_cast=False)
+
+        class Klass(Declared):
+            a = var(int, required=True)
+            b = var(Inner)
+            c = var(new_list_type(Inner))
+
+            def __post_init__(self):
+                raise AssertionError("not called")
+
+        inst = Klass.from_dict({"b": {"y": 1}, "c": [{"x": "1"}, {"y": 2}]}, validate=False)
+        self.assertIsNone(inst.a)
+        self.assertEqual(inst.b.x, "x")
+        self.assertEqual([i.x for i in inst.c], ["1", "x"])
+
+        result = new_list_type(Klass).from_dicts([{"a": "1", "b": {"y": 1}}], validate=False)
+        self.assertEqual((result[0].a, result[0].b.x), (1, "x"))
+
+    def test_same_as_validated(self):
+
+        class Leaf(Declared):
+            x = var(int)
+            y = var(int, required=False)
+
+        class Trusted(Declared, validate=False):
+            x = var(int)
+            y = var(int, required=False)
+
+        validated = Leaf.from_dict({"x": 1})
+        for leaf in (Leaf.from_dict({"x": 1}, validate=False), Leaf.construct(x=1),
+                     Leaf.from_dict({"x": 1}, only=["x", "y"], validate=False),
+                     new_list_type(Leaf).from_dicts([{"x": 1}], validate=False)[0]):
+            self.assertEqual(leaf, validated)
+            self.assertEqual(hash(leaf), hash(validated))
+            self.assertEqual(str(leaf), str(validated))
+        self.assertEqual(Trusted(x=1), Trusted.from_dict({"x": 1}))
+        self.assertEqual(list(Trusted.iter_jsonl(['{"x": 1}'])), [Trusted(x=1)])
+
+    def test_class_option(self):
+
+        class Klass(Declared, validate=False):
+            a = var(int)
+            b = var(int, default="not checked", auto_cast=False)
+
+        class Child(Klass):
+            c = var(int)
+
+        class CheckedChild(Klass, validate=True):
+            c = var(int)
+
+        inst = Klass(1)
+        inst.a = "a"
+        self.assertEqual((inst.a, inst.b), ("a", "not checked"))
+        self.assertIs(Klass.__setattr__, object.__setattr__)
+        self.assertIs(type(Klass.from_dict({"a": 1})), Klass)
+        Child(1, c=2).c = "c"
+        self.assertRaises(TypeError, setattr, CheckedChild(1, 2, 3), "c", "c")
+
+
+class CopyPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Box(object):
+
+            def __init__(self, items):
+                self.items = items
+
+        class Record(Declared):
+            name = var(str)
+            amount = var(Decimal)
+            box = var(Box, auto_cast=False)
+
+        self.Box = Box
+        self.record = Record(name="a", amount=Decimal("1.5"), box=Box([1, 2]))
+
+    def test_none(self):
+        data = self.record.to_dict(copy="none")
+        self.assertIs(data["box"], self.record.box)
+        self.assertIs(data["amount"], self.record.amount)
+
+    def test_shallow(self):
+        data = self.record.to_dict()
+        self.assertIsNot(data["box"], self.record.box)
+        self.assertIs(data["box"].items, self.record.box.items)
+        self.assertIs(data["amount"], self.record.amount)
+        self.assertIs(data["name"], self.record.name)
+
+    def test_deep(self):
+        data = self.record.to_dict(copy="deep")
+        self.assertIsNot(data["box"], self.record.box)
+        self.assertIsNot(data["box"].items, self.record.box.items)
+        self.assertEqual(data["box"].items, [1, 2])
+        self.assertIs(data["amount"], self.record.amount)
+
+    def test_nested_mapping(self):
+        class Holder(Declared):
+            extra = var(dict, auto_cast=False)
+
+        box = self.Box([])
+        holder = Holder(extra={"box": box})
+        self.assertIs(holder.to_dict(copy="none")["extra"]["box"], box)
+        self.assertIsNot(holder.to_dict(copy="shallow")["extra"]["box"], box)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.record.to_dict(copy="full")
+
+
+class StreamingJsonEncodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Item(Declared):
+            name = var(str)
+            price = var(Decimal)
+            note = var(str, required=False)
+
+        self.Items = new_list_type(Item)
+        self.items = self.Items([Item(name=f"item {i}", price=Decimal(i)) for i in range(50)])
+
+    def test_same_as_to_json(self):
+        for kwargs in ({}, {"indent": 2}, {"indent": "\t", "sort_keys": True}, {"separators": (",", ":")},
+                       {"skip_none_field": True}):
+            self.assertEqual("".join(self.items.to_json_iter(**kwargs)), self.items.to_json(**kwargs))
+            self.assertEqual("".join(self.items.to_json_iter(chunk_size=1, **kwargs)), self.items.to_json(**kwargs))
+
+    def test_empty(self):
+        self.assertEqual("".join(self.Items().to_json_iter()), "[]")
+        self.assertEqual("".join(self.Items().to_json_iter(indent=2)), self.Items().to_json(indent=2))
+
+    def test_chunks(self):
+        chunks = list(self.items.to_json_iter(chunk_size=100))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) < 200 for chunk in chunks))
+        self.assertEqual("".join(chunks), self.items.to_json())
+
+    def test_dump(self):
+        text = io.StringIO()
+        self.items.dump(text, indent=2)
+        self.assertEqual(text.getvalue(), self.items.to_json(indent=2))
+
+        binary = io.BytesIO()
+        self.items.dump(binary)
+        self.assertEqual(binary.getvalue(), self.items.to_json().encode("utf-8"))
+
+
+class LazyDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class LazyLeaf(Declared):
+            x = var(int)
+
+        class LazyMid(Declared):
+            leaf = var(LazyLeaf)
+            n = var(int, required=False)
+
+        class LazyTop(Declared):
+            name = var(str)
+            mid = var(LazyMid)
+            leaves = var(new_list_type(LazyLeaf))
+
+        self.LazyTop = LazyTop
+        self.data = {"name": "top", "mid": {"leaf": {"x": "1"}, "n": 2}, "leaves": [{"x": 1}, {"x": "2"}]}
+
+    def test_decode_on_access(self):
+        top = self.LazyTop.from_dict(self.data, lazy=True)
+        self.assertNotIn("mid", top.__dict__)
+        self.assertEqual(top.name, "top")
+        self.assertEqual(top.mid.leaf.x, 1)
+        self.assertIn("mid", top.__dict__)
+        self.assertEqual([leaf.x for leaf in top.leaves], [1, 2])
+        self.assertEqual(top, self.LazyTop.from_dict(self.data))
+
+    def test_hash(self):
+        lazy = self.LazyTop.from_dict(self.data, lazy=True)
+        eager = self.LazyTop.from_dict(self.data)
+        self.assertEqual(lazy, eager)
+        self.assertEqual(hash(lazy), hash(eager))
+        self.assertIn(lazy, {eager})
+
+    def test_raw_pass_through(self):
+        top = self.LazyTop.from_dict(self.data, lazy=True)
+        self.assertIs(top.to_dict(copy="none")["mid"], self.data["mid"])
+        data = top.to_dict()
+        self.assertEqual(data["mid"], self.data["mid"])
+        self.assertIsNot(data["mid"], self.data["mid"])
+        self.assertNotIn("mid", top.__dict__)
+
+        # the untouched leaf is still raw
+        top.mid.n = 3
+        self.assertEqual(top.to_dict()["mid"], {"leaf": {"x": "1"}, "n": 3})
+
+    def test_set_before_access(self):
+        top = self.LazyTop.from_json('{"name": "top", "mid": {"leaf": {"x": 1}}, "leaves": []}', lazy=True)
+        top.mid = self.LazyTop.from_dict(self.data).mid
+        self.assertEqual(top.to_dict()["mid"], {"leaf": {"x": 1}, "n": 2})
+
+    def test_required(self):
+        with self.assertRaises(AttributeError):
+            self.LazyTop.from_dict({"name": "top", "leaves": []}, lazy=True)
+
+    def test_without_validation(self):
+        top = self.LazyTop.from_dict(self.data, validate=False, lazy=True)
+        self.assertEqual(top.mid.leaf.x, 1)
+        self.assertEqual(top, self.LazyTop.from_dict(self.data))
+
+    def test_slots_decoded_eagerly(self):
+        class SlotsLeaf(Declared, slots=True):
+            x = var(int)
+
+        class SlotsTop(Declared, slots=True):
+            leaf = var(SlotsLeaf)
+
+        top = SlotsTop.from_dict({"leaf": {"x": 1}}, lazy=True)
+        self.assertEqual(top, SlotsTop(SlotsLeaf(1)))
+
+
+class ProjectionDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class ProjLeaf(Declared):
+            x = var(int)
+            y = var(int, default=5)
+
+        class ProjMid(Declared):
+            leaf = var(ProjLeaf)
+            n = var(int, required=False)
+
+        class ProjTop(Declared):
+            name = var(str)
+            mid = var(ProjMid)
+            leaves = var(new_list_type(ProjLeaf))
+
+        self.ProjTop = ProjTop
+        self.data = {"name": "top", "mid": {"leaf": {"x": "1", "y": 2}, "n": 2}, "leaves": [{"x": 1}, {"x": "2"}]}
+
+    def test_only(self):
+        top = self.ProjTop.from_dict(self.data, only=["name", "leaves.x"])
+        self.assertEqual(top.name, "top")
+        self.assertIsNone(top.mid)
+        self.assertEqual([(leaf.x, leaf.y) for leaf in top.leaves], [(1, 5), (2, 5)])
+        self.assertNotIn("mid", top.__dict__)
+
+    def test_exclude(self):
+        top = self.ProjTop.from_json(json.dumps(self.data), exclude=["mid.leaf", "leaves"])
+        self.assertEqual(top.mid.n, 2)
+        self.assertIsNone(top.mid.leaf)
+        self.assertIsNone(top.leaves)
+
+    def test_only_and_exclude(self):
+        top = self.ProjTop.from_dict(self.data, only=["mid"], exclude=["mid.leaf.y"])
+        self.assertEqual(top.mid.leaf.x, 1)
+        self.assertEqual(top.mid.leaf.y, 5)
+        self.assertIsNone(top.name)
+
+    def test_required(self):
+        with self.assertRaises(AttributeError):
+            self.ProjTop.from_dict({"mid": {"leaf": {"x": 1}}}, only=["name", "mid"])
+        top = self.ProjTop.from_dict({"mid": {"leaf": {"x": 1}}}, only=["mid"])
+        self.assertRaises(AttributeError, top.to_dict)
+
+    def test_unknown_path(self):
+        self.assertRaises(ValueError, self.ProjTop.from_dict, self.data, only=["nothing"])
+        self.assertRaises(ValueError, self.ProjTop.from_dict, self.data, only=["name.x"])
+
+    def test_lazy(self):
+        top = self.ProjTop.from_dict(self.data, exclude=["mid.n"], lazy=True)
+        self.assertIn("mid", top.__dict__["__declared_raw__"])
+        self.assertIsNone(top.mid.n)
+        self.assertEqual(top.mid.leaf.x, 1)
+
+    def test_from_xml(self):
+        xml = "<top><name>top</name><mid><leaf><x>3</x></leaf><n>4</n></mid></top>"
+        top = self.ProjTop.from_xml_string(xml, only=["mid.leaf.x"])
+        self.assertEqual(top.mid.leaf.x, 3)
+        self.assertIsNone(top.name)
+        self.assertIsNone(top.mid.n)
+
+
+class LazyListTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class LazyItem(Declared):
+            x = var(int)
+
+            __xml_tag_name__ = "item"
+
+        self.LazyItem = LazyItem
+        self.Items = new_lazy_list_type(LazyItem)
+
+    def test_decode_on_access(self):
+        items = self.Items.from_json('[{"x": "1"}, {"x": 2}, {"x": 3}]')
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[1:].data, [{"x": 2}, {"x": 3}])
+        self.assertEqual(items[0].x, 1)
+        self.assertEqual(items.data[1:], [{"x": 2}, {"x": 3}])
+        self.assertEqual([item.x for item in items], [1, 2, 3])
+        self.assertEqual(items, new_list_type(self.LazyItem)([self.LazyItem(i) for i in (1, 2, 3)]))
+
+    def test_raw_pass_through(self):
+        items = self.Items.from_dicts([{"x": "1"}, {"x": 2}])
+        self.assertEqual(items.to_json(), '[{"x": "1"}, {"x": 2}]')
+        self.assertEqual("".join(items.to_json_iter()), items.to_json())
+        self.assertEqual(items.data, [{"x": "1"}, {"x": 2}])
+
+    def test_xml(self):
+        items = self.Items.from_xml_string("<items><item><x>1</x></item><item><x>2</x></item></items>")
+        self.assertEqual(ET.tostring(items.to_xml()), b"<items><item><x>1</x></item><item><x>2</x></item></items>")
+        self.assertTrue(all(isinstance(item, ET.Element) for item in items.data))
+        self.assertEqual(items.to_json(), '[{"x": 1}, {"x": 2}]')
+
+    def test_list_type(self):
+        self.assertTrue(issubclass(self.Items, new_list_type(self.LazyItem)))
+        self.assertIs(new_lazy_list_type(self.LazyItem), self.Items)
+        self.assertRaises(TypeError, new_lazy_list_type, int)
+
+    def test_lazy_declared(self):
+        class LazyBox(Declared):
+            items = var(new_list_type(self.LazyItem))
+
+        box = LazyBox.from_dict({"items": [{"x": 1}, {"x": "2"}]}, lazy=True)
+        self.assertIsInstance(box.items, self.Items)
+        self.assertEqual(box.items.data, [{"x": 1}, {"x": "2"}])
+        self.assertEqual(box.items.pop().x, 2)
+        self.assertEqual(box.to_dict(), {"items": [{"x": 1}]})
+
+
+class XmlChildIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class XmlTag(Declared):
+            value = var(str, as_xml_text=True)
+
+            __xml_tag_name__ = "tag"
+
+        class XmlInner(Declared):
+            size = var(int)
+
+            __xml_tag_name__ = "inner"
+
+        class XmlRecord(Declared):
+            name = var(str)
+            note = var(str, required=False)
+            level = var(int, default=1)
+            inner = var(XmlInner, required=False)
+            tag = var(new_list_type(XmlTag))
+
+            __xml_tag_name__ = "record"
+
+        self.XmlRecord = XmlRecord
+
+    def test_repeated_children(self):
+        record = self.XmlRecord.from_xml_string(
+            "<record><tag>a</tag><name>n</name><tag>b</tag><inner><size>2</size></inner><tag>c</tag></record>")
+        self.assertEqual([tag.value for tag in record.tag], ["a", "b", "c"])
+        self.assertEqual(record.inner.size, 2)
+        self.assertEqual(record.name, "n")
+
+    def test_missing_optional_nodes(self):
+        record = self.XmlRecord.from_xml_string("<record><name>n</name></record>")
+        self.assertEqual(record.level, 1)
+        self.assertEqual(len(record.tag), 0)
+        self.assertEqual(record.to_dict(), {"name": "n", "note": None, "level": 1, "inner": None, "tag": []})
+
+    def test_missing_required_node(self):
+        with self.assertRaises(AttributeError) as context:
+            self.XmlRecord.from_xml_string("<record><note>x</note></record>")
+        self.assertIn("'name' is required", str(context.exception))
+
+
+class XmlStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class StreamItem(Declared):
+            name = var(str, as_xml_attr=True)
+            text = var(str, as_xml_text=True)
+
+            __xml_tag_name__ = "item"
+
+        class StreamStyle(Declared):
+            name = var(str, as_xml_attr=True)
+            parent = var(str, as_xml_attr=True, default=None)
+            size = var(int, required=False)
+            note = var(str, required=False)
+            items = var(new_list_type(StreamItem), field_name="item")
+
+            __xml_tag_name__ = "style"
+
+        self.StreamItem = StreamItem
+        self.Styles = new_list_type(StreamStyle)
+        self.styles = self.Styles.from_xml_string(
+            '<resources><style name="a&amp;b" parent="p"><size>0</size><note>x &lt; y</note>'
+            '<item name="i">caf\u00e9</item><item name="j">&lt;escaped&gt;</item></style>'
+            '<style name="empty" /></resources>')
+        self.styles[0].items.append(StreamItem(name="k", text="<![CDATA[<kept>]]>"))
+
+    def test_same_as_to_xml_bytes(self):
+        binary = io.BytesIO()
+        self.styles.to_xml_stream(binary)
+        self.assertEqual(binary.getvalue(), self.styles.to_xml_bytes())
+        self.assertIn(b"<![CDATA[<kept>]]>", binary.getvalue())
+
+        for style in self.styles:
+            binary = io.BytesIO()
+            style.to_xml_stream(binary)
+            self.assertEqual(binary.getvalue(), style.to_xml_bytes())
+
+    def test_unset_text(self):
+        class OptionalItem(Declared):
+            id = var(str, as_xml_attr=True)
+            text = var(str, as_xml_text=True, required=False)
+
+            __xml_tag_name__ = "item"
+
+        item = OptionalItem(id="2")
+        self.assertEqual(item.to_xml_bytes(), b'<item id="2" />')
+        binary = io.BytesIO()
+        item.to_xml_stream(binary)
+        self.assertEqual(binary.getvalue(), b'<item id="2" />')
+
+    def test_encoding(self):
+        binary = io.BytesIO()
+        self.styles.to_xml_stream(binary, encoding="utf-8")
+        self.assertEqual(binary.getvalue(), self.styles.to_xml_bytes(encoding="utf-8"))
+
+        text = io.StringIO()
+        self.styles.to_xml_stream(text)
+        self.assertEqual(text.getvalue(), self.styles.to_xml_bytes(encoding="unicode"))
+
+    def test_empty_list(self):
+        binary = io.BytesIO()
+        self.Styles(tag="resources").to_xml_stream(binary)
+        self.assertEqual(binary.getvalue(), b"<resources />")
+
+    def test_lazy_list(self):
+        xml = '<items><item name="a">1</item><item name="b">2</item></items>'
+        items = new_lazy_list_type(self.StreamItem).from_xml_string(xml)
+        text = io.StringIO()
+        items.to_xml_stream(text)
+        self.assertEqual(text.getvalue(), xml)
+
+
+class ScopedCDataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Note(Declared):
+            lang = var(str, as_xml_attr=True)
+            body = var(str, as_xml_text=True)
+
+        class Page(Declared):
+            title = var(str)
+            count = var(int)
+            note = var(Note)
+
+        self.page = Page(title="<![CDATA[a <b> & c]]>", count=3, note=Note(lang="en", body="<![CDATA[<p>]]>"))
+
+    def test_cdata_kept(self):
+        self.assertEqual(
+            self.page.to_xml_bytes(),
+            b'<page><title><![CDATA[a <b> & c]]></title><count>3</count><note lang="en"><![CDATA[<p>]]></note></page>')
+        stream = io.BytesIO()
+        self.page.to_xml_stream(stream)
+        self.assertEqual(stream.getvalue(), self.page.to_xml_bytes())
+
+    def test_other_element_tree_users(self):
+        self.assertIs(ET._escape_cdata, ET_escape_cdata)
+        element = ET.Element("title")
+        element.text = "<![CDATA[a]]>"
+        self.assertEqual(ET.tostring(element), b"<title>&lt;![CDATA[a]]&gt;</title>")
+
+    def test_text_is_str(self):
+        title = self.page.to_xml().find("title").text
+        self.assertEqual(title, "<![CDATA[a <b> & c]]>")
+        self.assertEqual(title.replace("a", "x"), "<![CDATA[x <b> & c]]>")
+        self.assertEqual(self.page.to_xml().find("count").text, "3")
+
+
+class BinaryFormatTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Leaf(Declared):
+            x = var(int)
+            y = var(float, required=False)
+
+        class Record(Declared):
+            id = var(UUID)
+            name = var(str)
+            amount = var(Decimal)
+            at = var(datetime)
+            ok = var(bool)
+            leaf = var(Leaf)
+            leaves = var(new_list_type(Leaf))
+            extra = var(dict, auto_cast=False)
+
+        self.Leaf = Leaf
+        self.Record = Record
+        self.record = Record(
+            id=UUID("12345678-1234-5678-1234-567812345678"), name="h\u00e9llo", amount=Decimal("-12.50"),
+            at=datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=timezone(timedelta(hours=8))), ok=True,
+            leaf=Leaf(x=-5, y=1.5), leaves=new_list_type(Leaf)([Leaf(x=i) for i in range(3)]),
+            extra={"a": [1, None, "x"], 1: b"b"})
+
+    def test_round_trip(self):
+        data = self.record.to_binary()
+        self.assertLess(len(data), len(self.record.to_json()))
+        record = self.Record.from_binary(data)
+        self.assertEqual(record, self.record)
+        self.assertEqual(record.at.utcoffset(), timedelta(hours=8))
+        self.assertIs(record.leaves[0].y, MISSING)
+        self.assertEqual(record.extra, {"a": [1, None, "x"], 1: b"b"})
+
+    def test_list(self):
+        records = new_list_type(self.Record)([self.record] * 2, tag="records")
+        loaded = new_list_type(self.Record).from_binary(records.to_binary())
+        self.assertEqual(loaded, records)
+        self.assertEqual(loaded.tag, "records")
+
+    def test_schema_mismatch(self):
+        class Other(Declared):
+            x = var(str)
+            y = var(float, required=False)
+
+        with self.assertRaises(ValueError):
+            Other.from_binary(self.Leaf(x=1).to_binary())
+        with self.assertRaises(ValueError):
+            self.Leaf.from_binary(b"not binary")
+        with self.assertRaises(ValueError):
+            self.Leaf.from_binary(self.Leaf(x=1).to_binary() + b"\x00")
+
+    def test_truncated(self):
+        data = self.record.to_binary()
+        for size in (len(data) - 1, len(data) // 2, 3):
+            with self.assertRaises(ValueError):
+                self.Record.from_binary(data[:size])
+        data = new_list_type(self.Leaf)([self.Leaf(x=1, y=1.5)]).to_binary()
+        with self.assertRaises(ValueError):
+            new_list_type(self.Leaf).from_binary(data[:-1])
+
+    def test_cast(self):
+        class Color(Enum):
+            RED = 1
+            BLUE = 2
+
+        class Painted(Declared):
+            color = var(Color)
+            colors = var(new_list_type(Color), required=False)
+
+        painted = Painted(color=Color.RED, colors=new_list_type(Color)([Color.BLUE]))
+        loaded = Painted.from_binary(painted.to_binary())
+        self.assertIs(loaded.color, Color.RED)
+        self.assertIs(loaded.colors[0], Color.BLUE)
+        self.assertEqual(loaded, painted)
+
+    def test_slots(self):
+        class Slotted(Declared, slots=True):
+            x = var(int)
+            y = var(str, required=False)
+
+        self.assertEqual(Slotted.from_binary(Slotted(x=1, y="a").to_binary()), Slotted(x=1, y="a"))
+
+    def test_validate(self):
+        class Counted(Declared):
+            x = var(int)
+
+            def __post_init__(self, **omits):
+                raise ValueError("initialized")
+
+        data = Counted.__new__(Counted)
+        data.x = 1
+        data = data.to_binary()
+        with self.assertRaises(ValueError):
+            Counted.from_binary(data, validate=True)
+        self.assertEqual(Counted.from_binary(data, validate=False).x, 1)
+
+
+class PickledLeaf(Declared):
+    x = var(int)
+    y = var(float, required=False)
+    z = var(list, default_factory=list)
+
+    def __post_init__(self, **omits):
+        self.initialized = getattr(self, "initialized", 0) + 1
+
+
+class PickledSlots(Declared, slots=True):
+    x = var(int)
+    y = var(str, required=False)
+
+
+class PickledTop(Declared):
+    leaf = var(PickledLeaf)
+    leaves = var(new_list_type(PickledLeaf))
+
+
+class PicklingTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        leaf = PickledLeaf(x=1, z=[1])
+        loaded = pickle.loads(pickle.dumps(leaf))
+        self.assertEqual(loaded, leaf)
+        self.assertIs(loaded.y, MISSING)
+        self.assertEqual(loaded.initialized, 1)
+
+        slotted = pickle.loads(pickle.dumps(PickledSlots(x=1)))
+        self.assertEqual(slotted, PickledSlots(x=1))
+        self.assertIs(slotted.y, MISSING)
+
+    def test_unset(self):
+        for leaf in (PickledLeaf.construct(y=1.5), PickledSlots.construct(y="a")):
+            self.assertIsNone(pickle.loads(pickle.dumps(leaf)).x)
+            self.assertIsNone(leaf.replace(y=None).x)
+            self.assertIsNone(leaf.x)
+
+    def test_positional(self):
+        func, args = PickledSlots(x=1, y="a").__reduce__()
+        self.assertEqual(args, (PickledSlots, (1, "a")))
+        self.assertIs(pickle.loads(pickle.dumps(MISSING)), MISSING)
+
+    def test_not_validated(self):
+        leaf = PickledLeaf(x=1)
+        leaf.__dict__["x"] = "1"
+        loaded = pickle.loads(pickle.dumps(leaf))
+        self.assertEqual(loaded.x, "1")
+        self.assertEqual(loaded.initialized, 1)
+
+    def test_nested(self):
+        top = PickledTop.from_dict({"leaf": {"x": "2"}, "leaves": [{"x": 3}, {"x": 4}]}, lazy=True)
+        loaded = pickle.loads(pickle.dumps(top))
+        self.assertEqual(loaded, top)
+        self.assertIsInstance(loaded.leaves, new_list_type(PickledLeaf))
+
+        leaves = new_lazy_list_type(PickledLeaf).from_dicts([{"x": 1}, {"x": 2}])
+        leaves.tag = "leaves"
+        loaded = pickle.loads(pickle.dumps(leaves))
+        self.assertIs(type(loaded), new_lazy_list_type(PickledLeaf))
+        self.assertEqual(loaded.tag, "leaves")
+        self.assertEqual(loaded[1].x, 2)
+
+
+class ParallelLeaf(Declared):
+    x = var(int)
+    y = var(str)
+
+
+class ParallelRow(Declared):
+    id = var(int)
+    name = var(str)
+    leaf = var(ParallelLeaf)
+
+
+class ParallelDecodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.Rows = new_list_type(ParallelRow)
+        self.rows = [{"id": i, "name": f"name{i}", "leaf": {"x": i, "y": "z"}} for i in range(200)]
+
+    def test_json(self):
+        for data in (json.dumps(self.rows), json.dumps(self.rows, indent=2), json.dumps(self.rows).encode()):
+            result = self.Rows.from_json_parallel(data, workers=2, chunk_size=1000)
+            self.assertIs(type(result), self.Rows)
+            self.assertEqual(result, self.Rows.from_json(data))
+
+    def test_split_inside_item(self):
+        # separators inside strings make some chunks fail to parse, the array is decoded in the current process
+        self.rows[50]["name"] = ', {"id": 1, "name": "' * 200
+        data = json.dumps(self.rows)
+        self.assertEqual(self.Rows.from_json_parallel(data, workers=2, chunk_size=1000), self.Rows.from_json(data))
+        with self.assertRaises(json.JSONDecodeError):
+            self.Rows.from_json_parallel(data[:-1], workers=2, chunk_size=1000)
+
+    def test_xml(self):
+        Leaves = new_list_type(ParallelLeaf)
+        leaves = Leaves([ParallelLeaf(x=i + 1, y="z") for i in range(100)])
+        data = b'<?xml version="1.0"?>\n<!-- leaves --><leaves version="a>b">' + leaves.to_xml_bytes(tag="leaves")[8:]
+        result = Leaves.from_xml_parallel(data, workers=2, chunk_size=500)
+        self.assertEqual(result.tag, "leaves")
+        self.assertEqual(result, leaves)
+        self.assertEqual(Leaves.from_xml_parallel(data.decode(), workers=2, chunk_size=500), leaves)
+
+    def test_local_class(self):
+        class LocalRow(Declared):
+            id = var(int)
+            name = var(str)
+
+        Rows = new_list_type(LocalRow)
+        data = json.dumps([{"id": i, "name": f"name{i}"} for i in range(200)])
+        self.assertEqual(Rows.from_json_parallel(data, workers=2, chunk_size=1000), Rows.from_json(data))
+        self.assertEqual(self.Rows.from_json_parallel(json.dumps(self.rows), workers=2, chunk_size=1000,
+                                                      parse_int=lambda text: int(text)),
+                         self.Rows.from_json(json.dumps(self.rows)))
+
+
+class AsyncStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Record(Declared):
+            id = var(int)
+            name = var(str)
+
+        self.Record = Record
+        self.records = new_list_type(Record)([Record(id=i, name="n" * i) for i in range(200)])
+
+    def serve(self, handle, client):
+        # runs `client` against a local server which runs `handle`
+        async def main():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            try:
+                port = server.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                try:
+                    return await client(reader, writer)
+                finally:
+                    writer.close()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        return asyncio.run(main())
+
+    def test_aiter_jsonl(self):
+        data = io.BytesIO()
+        self.records.to_jsonl(data)
+        data = data.getvalue().rstrip(b"\n") + b"\n\n"
+
+        async def handle(reader, writer):
+            # lines are split anywhere
+            for i in range(0, len(data), 100):
+                writer.write(data[i:i + 100])
+                await writer.drain()
+            writer.close()
+
+        with ThreadPoolExecutor(1) as pool:
+            for executor in (None, pool):
+                async def client(reader, writer):
+                    return [item async for item in self.Record.aiter_jsonl(reader, executor=executor, chunk_size=64)]
+
+                self.assertEqual(self.serve(handle, client), list(self.records))
+
+    def test_awrite_json(self):
+        received = []
+
+        async def handle(reader, writer):
+            received.append(await reader.read())
+            writer.close()
+
+        with ThreadPoolExecutor(1) as pool:
+            for executor in (None, pool):
+                async def client(reader, writer):
+                    await self.records.awrite_json(writer, executor=executor, indent=2, chunk_size=100)
+                    writer.write_eof()
+                    await reader.read()
+
+                self.serve(handle, client)
+                self.assertEqual(received.pop().decode("utf-8"), self.records.to_json(indent=2))
+
+
+class FrozenLeaf(Declared, frozen=True):
+    x = var(int)
+    tags = var(list, default_factory=list)
+
+
+class FrozenTop(Declared, frozen=True, slots=True):
+    leaf = var(FrozenLeaf)
+    note = var(str, required=False)
+
+
+class FrozenTestCase(unittest.TestCase):
+
+    def test_setattr(self):
+        leaf = FrozenLeaf(x=1)
+        with self.assertRaises(AttributeError):
+            leaf.x = 2
+        with self.assertRaises(AttributeError):
+            leaf.other = 2
+        with self.assertRaises(AttributeError):
+            del leaf.x
+        self.assertEqual(leaf.x, 1)
+
+    def test_inherit(self):
+        class Child(FrozenLeaf):
+            y = var(int, required=False)
+
+        child = Child(x=1, y=2)
+        with self.assertRaises(AttributeError):
+            child.y = 3
+        with self.assertRaises(TypeError):
+            class MutableChild(FrozenLeaf, frozen=False):
+                pass
+
+        class Mutable(Declared):
+            x = var(int)
+
+        class Frozen(Mutable, frozen=True):
+            pass
+
+        with self.assertRaises(AttributeError):
+            Frozen(x=1).x = 2
+
+        class Trusted(Declared, validate=False):
+            x = var(int)
+
+        class FrozenTrusted(Trusted, frozen=True):
+            y = var(int)
+
+        obj = FrozenTrusted(1, 2)
+        value = hash(obj)
+        with self.assertRaises(AttributeError):
+            obj.x = 5
+        self.assertEqual(obj.x, 1)
+        self.assertEqual(hash(obj), value)
+
+    def test_hash(self):
+        top = FrozenTop(leaf=FrozenLeaf(x=1), note="a")
+        value = hash(top)
+        self.assertEqual(top.__declared_hash__, value)
+        self.assertEqual(hash(top), value)
+        self.assertEqual(hash(FrozenTop(leaf=FrozenLeaf(x=1), note="a")), value)
+
+    def test_to_dict(self):
+        top = FrozenTop.from_json('{"leaf": {"x": "1", "tags": ["a"]}, "note": "b"}')
+        kvs = top.to_dict()
+        self.assertEqual(kvs, {"leaf": {"x": 1, "tags": ["a"]}, "note": "b"})
+        kvs["leaf"]["tags"].append("c")
+        kvs["note"] = "c"
+        self.assertEqual(top.to_dict(), {"leaf": {"x": 1, "tags": ["a"]}, "note": "b"})
+        self.assertIsNot(top.to_dict(), top.to_dict())
+        self.assertEqual(top.to_dict(skip_none_field=True), {"leaf": {"x": 1, "tags": ["a"]}, "note": "b"})
+
+    def test_to_json(self):
+        top = FrozenTop(leaf=FrozenLeaf(x=1))
+        self.assertEqual(json.loads(top.to_json()), {"leaf": {"x": 1, "tags": []}, "note": None})
+        self.assertIs(top.to_json(), top.to_json())
+        self.assertEqual(top.to_json(skip_none_field=True), '{"leaf": {"x": 1, "tags": []}}')
+
+    def test_pickle(self):
+        top = FrozenTop(leaf=FrozenLeaf(x=1), note="a")
+        hash(top)
+        top.to_json()
+        loaded = pickle.loads(pickle.dumps(top))
+        self.assertEqual(loaded, top)
+        with self.assertRaises(AttributeError):
+            loaded.note = "b"
+
+
+class ReplaceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Address(Declared):
+            city = var(str)
+
+        class Person(Declared):
+            name = var(str)
+            age = var(int)
+            tags = var(list, default_factory=list)
+            address = var(Address)
+            friends = var(new_list_type(Address), required=False)
+
+        self.Person = Person
+        self.person = Person.from_dict({"name": "John", "age": "18", "address": {"city": "Paris"},
+                                        "friends": [{"city": "Rome"}]})
+
+    def test_replace(self):
+        person = self.person.replace(name="Jane", age=21)
+        self.assertEqual(person.to_dict(), {"name": "Jane", "age": 21, "tags": [], "address": {"city": "Paris"},
+                                            "friends": [{"city": "Rome"}]})
+        self.assertEqual(self.person.name, "John")
+        self.assertIs(person.address, self.person.address)
+        self.assertIs(person.friends, self.person.friends)
+        self.assertIs(person.tags, self.person.tags)
+        self.assertEqual(self.person.replace(), self.person)
+        self.assertIsNot(self.person.replace(), self.person)
+
+    def test_check(self):
+        with self.assertRaises(TypeError):
+            self.person.replace(age="21")
+        with self.assertRaises(TypeError):
+            self.person.replace(unknown=1)
+
+        class Trusted(Declared, validate=False):
+            age = var(int)
+
+        self.assertEqual(Trusted(age=1).replace(age="2").age, "2")
+
+    def test_slots_and_frozen(self):
+        top = FrozenTop(leaf=FrozenLeaf(x=1), note="a")
+        hash(top)
+        top.to_json()
+        replaced = top.replace(note="b")
+        self.assertEqual(replaced.to_dict(), {"leaf": {"x": 1, "tags": []}, "note": "b"})
+        self.assertIs(replaced.leaf, top.leaf)
+        self.assertNotEqual(hash(replaced), hash(top))
+        with self.assertRaises(AttributeError):
+            replaced.note = "c"
+
+    def test_lazy(self):
+        person = self.Person.from_json(self.person.to_json(), lazy=True)
+        self.assertEqual(person.replace(age=20).address.city, "Paris")
+
+    def test_extra_attributes(self):
+        self.person.visited = True
+        self.assertTrue(self.person.replace(age=20).visited)
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Address(Declared):
+            city = var(str)
+            zip = var(int, as_xml_attr=True)
+
+        class Person(Declared):
+            name = var(str)
+            age = var(int)
+            address = var(Address)
+
+        self.Person = Person
+        self.data = {"name": "John", "age": "18", "address": {"city": "Paris", "zip": 75001}}
+
+    def tearDown(self):
+        disable_profiling()
+
+    def test_disabled(self):
+        self.Person.from_dict(self.data).to_json()
+        self.assertEqual(profiling_snapshot(), {})
+        self.assertEqual(disable_profiling(), {})
+
+    def test_snapshot(self):
+        enable_profiling()
+        person = self.Person.from_dict(self.data)
+        dumped = person.to_json()
+        self.Person.from_json(dumped)
+        person.to_xml()
+        snapshot = profiling_snapshot()
+
+        person_stats = snapshot["classes"]["Person"]
+        self.assertEqual(person_stats["from_dict"]["calls"], 2)
+        self.assertEqual(person_stats["to_dict"]["calls"], 1)
+        self.assertEqual(person_stats["to_json"]["bytes"], len(dumped))
+        self.assertEqual(person_stats["from_json"]["bytes"], len(dumped))
+        self.assertGreaterEqual(person_stats["to_json"]["seconds"], person_stats["to_dict"]["seconds"])
+        # nested objects are recorded by the calls of their own methods only
+        self.assertEqual(list(snapshot["classes"]["Address"]), ["to_xml"])
+        self.assertEqual(snapshot["classes"]["Address"]["to_xml"]["calls"], 1)
+        # only conversions are counted, "18" is cast to int but the json of the object has an int already
+        self.assertEqual(snapshot["casts"], {"Person.age": 1})
+
+    def test_bytes(self):
+        enable_profiling()
+        person = self.Person.from_dict({"name": "Jos\u00e9", "age": 18, "address": {"city": "Paris", "zip": 75001}})
+        dumped = person.to_json(ensure_ascii=False)
+        self.Person.from_json(dumped)
+        self.Person.from_json(dumped.encode("utf-8"))
+        person_stats = profiling_snapshot()["classes"]["Person"]
+        size = len(dumped.encode("utf-8"))
+        self.assertEqual(size, len(dumped) + 1)
+        self.assertEqual(person_stats["to_json"]["bytes"], size)
+        self.assertEqual(person_stats["from_json"]["bytes"], size * 2)
+
+    def test_reset(self):
+        enable_profiling()
+        self.Person.from_dict(self.data)
+        self.assertEqual(profiling_snapshot(reset=True)["casts"], {"Person.age": 1})
+        self.assertEqual(profiling_snapshot()["casts"], {})
+        self.Person.from_dict(self.data)
+        self.assertEqual(disable_profiling()["classes"]["Person"]["from_dict"]["calls"], 1)
+        self.assertEqual(profiling_snapshot(), {})
+
+
 if __name__ == "__main__":
     unittest.main()